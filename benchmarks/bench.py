@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Benchmarks of the stages of shootappearance.dataset (MIT license).
+# Usage:
+#   python benchmarks/bench.py --sizes small medium --output bench.json
+#   python benchmarks/bench.py --compare old.json new.json
+#   python benchmarks/bench.py --import-only --check-import
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import shootappearance as sa
+import synthetic
+
+# ntruss: fruit trusses per plant, nfruit: fruits per truss, ndays: days of temperature data, nplant: plants of batchdataset
+SIZES = {
+    'small': {'ntruss':10, 'nfruit':15, 'ndays':120, 'nplant':10},
+    'medium': {'ntruss':30, 'nfruit':20, 'ndays':365, 'nplant':50},
+    'large': {'ntruss':60, 'nfruit':25, 'ndays':730, 'nplant':200},
+}
+DATE = '2024-01-01'
+# Budget [s] of 'import shootappearance' in a new process. Submodules, numpy, pandas and scipy are imported lazily.
+IMPORTBUDGET = sa.IMPORTBUDGET
+# Statements of which import times are measured
+IMPORTS = {
+    'import shootappearance': 'import shootappearance',
+    'import shootappearance + dataset': 'import shootappearance; shootappearance.dataset',
+    'import shootappearance + curve_fit': 'import shootappearance; shootappearance.dataset; import scipy.optimize',
+}
+
+def measure(func, repeat):
+    """Wall time [s] of each of 'repeat' calls of func, and peak memory [bytes] allocated in the first call."""
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return result, times, peak
+
+def importtime(statement, repeat):
+    """Wall time [s] of running statement in each of 'repeat' new Python processes, minus the minimum time of starting Python."""
+    def run(code):
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            times.append(time.perf_counter() - start)
+        return times
+    startup = min(run('pass'))
+    return [t - startup for t in run(statement)]
+
+def imports(repeat):
+    results = []
+    for stage, statement in IMPORTS.items():
+        times = importtime(statement, repeat)
+        results.append({'size':'-', 'stage':stage, 'repeat':repeat, 'seconds_min':min(times), 'seconds_median':statistics.median(times), 'peak_bytes':None})
+        print('%-8s %-32s min %9.4f s  median %9.4f s' % ('-', stage, min(times), statistics.median(times)))
+    return results
+
+def stages(size):
+    """(stage name, function) of every stage of a synthetic plant of the size, in the order of the pipeline."""
+    ncompleaf = 2
+    dfleafnum, dffruitnum, dfleafsize, dffruitsize = synthetic.plant(ntruss=size['ntruss'], nfruit=size['nfruit'], ncompleaf=ncompleaf)
+    # 20 C every day: the oldest organs of the medium and large plants are older than the range of DVRI, which diverges (OverflowError) at other temperatures
+    dftemp = synthetic.temperature(ndays=max(size['ndays'], 7*(size['ntruss']+ncompleaf+4)), date=DATE, amplitude=0, noise=0)
+    state = {}
+
+    def complement():
+        shootdata = sa.dataset(dfleafnum, dffruitnum, dfleafsize, dffruitsize, ncompleaf=ncompleaf, ncompfruit=1)
+        state['shootdata'] = shootdata
+        state['complement'] = shootdata.complement(DATE)
+    def DVSI():
+        sa.dvsicache.clear()
+        nleafonplant, nfruitave, nbranchontruss, dfleaf, dffruit, DVS, measureddate = state['complement']
+        state['dffruit'] = state['shootdata'].DVSI(dffruit, 'DOEF', 'DVSF', measureddate, dftemp, 'Date', 'Temp')
+        state['dfleaf'] = state['shootdata'].DVSI(dfleaf, 'DOEL', 'DVSL', measureddate, dftemp, 'Date', 'Temp')
+    def Gompertz_fit():
+        state['poptfruit'] = state['shootdata'].Gompertz_fit(state['dffruit'], 'DVSF', 'value', 7, 0.1)[0]
+        state['poptleaf'] = state['shootdata'].Gompertz_fit(state['dfleaf'], 'DVSL', 'value', 7, 0.1)[0]
+    def interpolate_and_Gompertz_est():
+        state['dffruitest'] = state['shootdata'].interpolate_and_Gompertz_est(state['dffruit'], 'DVSF', 'value', state['poptfruit'])
+        state['dfleafest'] = state['shootdata'].interpolate_and_Gompertz_est(state['dfleaf'], 'DVSL', 'value', state['poptleaf'])
+    def initial_fruit_leaf():
+        state['dffruitinit'] = state['shootdata'].initial_fruit(state['dffruitest'], 'value', 0.08)
+        state['dfleafinit'] = state['shootdata'].initial_leaf(state['dfleafest'], 'value', 0.05)
+    def twoddf():
+        for colvalue in ['FF', 'FD', 'DOEF', 'DVSF']:
+            state['shootdata'].twoddf(state['dffruitinit'], 'id_truss', 'id_fruit', colvalue)
+        for colvalue in ['LA', 'LV', 'DOEL', 'LVAGE']:
+            state['shootdata'].twoddf(state['dfleafinit'], 'id_truss', 'id_leaf', colvalue)
+    def ensemble():
+        shootdata = state['shootdata']
+        poptfruit, pcovfruit, ymax = shootdata.Gompertz_fit(state['dffruit'], 'DVSF', 'value', 7, 0.1)
+        poptleaf, pcovleaf, ymax = shootdata.Gompertz_fit(state['dfleaf'], 'DVSL', 'value', 7, 0.1)
+        shootdata.ensemble_fruit(state['dffruit'], 'DVSF', 'value', poptfruit, pcovfruit, 1000, 0.08, seed=0)
+        shootdata.ensemble_leaf(state['dfleaf'], 'DVSL', 'value', poptleaf, pcovleaf, 1000, 0.05, seed=0)
+    def twoddfs():
+        state['shootdata'].twoddfs(state['dffruitinit'], 'id_truss', 'id_fruit', ['FF', 'FD', 'DOEF', 'DVSF'])
+        state['shootdata'].twoddfs(state['dfleafinit'], 'id_truss', 'id_leaf', ['LA', 'LV', 'DOEL', 'LVAGE'])
+
+    dfbatch = synthetic.plants(nplant=size['nplant'], ntruss=size['ntruss'], nfruit=size['nfruit'], ncompleaf=ncompleaf)
+    def batch():
+        sa.dvsicache.clear()
+        shootdata = sa.batchdataset(*dfbatch, ncompleaf=ncompleaf, ncompfruit=1)
+        dfplant, dfleaf, dffruit = shootdata.complement(DATE)
+        dffruit = shootdata.DVSI(dffruit, 'DOEF', 'DVSF', dfplant['measureddate'][0], dftemp, 'Date', 'Temp')
+        popt, pcov, ymax = shootdata.Gompertz_fit(dffruit, 'DVSF', 'value', 7, 0.1)
+        dffruit = shootdata.initial_fruit(shootdata.interpolate_and_Gompertz_est(dffruit, 'DVSF', 'value', popt), 'value', 0.08)
+        shootdata.twoddf(dffruit, 'id_truss', 'id_fruit', 'FF')
+
+    return [('complement', complement), ('DVSI', DVSI), ('Gompertz_fit', Gompertz_fit), ('interpolate_and_Gompertz_est', interpolate_and_Gompertz_est),
+            ('initial_fruit/initial_leaf', initial_fruit_leaf), ('twoddf', twoddf), ('twoddfs', twoddfs), ('ensemble (1000 members)', ensemble), ('batchdataset (fruit pipeline)', batch)]
+
+def run(sizes, repeat, importonly=False):
+    results = imports(repeat)
+    for name in ([] if importonly else sizes):
+        for stage, func in stages(SIZES[name]):
+            result, times, peak = measure(func, repeat)
+            results.append({'size':name, **SIZES[name], 'stage':stage, 'repeat':repeat, 'seconds_min':min(times), 'seconds_median':statistics.median(times), 'peak_bytes':peak})
+            print('%-8s %-32s min %9.4f s  median %9.4f s  peak %8.1f MB' % (name, stage, min(times), statistics.median(times), peak/1e6))
+    return {
+        'shootappearance':sa.__version__, 'python':platform.python_version(), 'numpy':np.__version__, 'pandas':pd.__version__,
+        'machine':platform.machine(), 'time':time.strftime('%Y-%m-%dT%H:%M:%S'), 'results':results}
+
+def compare(oldpath, newpath):
+    """Printing the ratio of median times (new/old) of the stages included in both result files."""
+    with open(oldpath) as f:
+        old = {(r['size'], r['stage']): r for r in json.load(f)['results']}
+    with open(newpath) as f:
+        new = {(r['size'], r['stage']): r for r in json.load(f)['results']}
+    for key in [key for key in new if key in old]:
+        ratio = new[key]['seconds_median'] / old[key]['seconds_median']
+        print('%-8s %-32s %9.4f s -> %9.4f s  x%.2f' % (key[0], key[1], old[key]['seconds_median'], new[key]['seconds_median'], ratio))
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Benchmarks of the stages of shootappearance.dataset.')
+    argparser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES))
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--output', default='bench.json', help='Path of the result file (JSON).')
+    argparser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files instead of running the benchmarks.')
+    argparser.add_argument('--import-only', action='store_true', help='Measure only the import times.')
+    argparser.add_argument('--check-import', action='store_true', help='Exit with status 1 if the median time of \'import shootappearance\' exceeds IMPORTBUDGET.')
+    args = argparser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        warnings.simplefilter('ignore')
+        output = run(args.sizes, args.repeat, importonly=args.import_only)
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+        if args.check_import:
+            seconds = [r['seconds_median'] for r in output['results'] if r['stage'] == 'import shootappearance'][0]
+            print('import shootappearance: %.4f s (budget %.4f s)' % (seconds, IMPORTBUDGET))
+            if seconds > IMPORTBUDGET:
+                sys.exit(1)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Synthetic plants for the benchmarks of shootappearance (MIT license).
+import datetime
+import numpy as np
+import pandas as pd
+
+def Gompertz(t, a, b, c):
+    return a * np.exp(-b * c**t)
+
+def plant(ntruss=10, nfruit=15, ncompleaf=2, seed=0):
+    """
+    Making dfleafnum, dffruitnum, dfleafsize and dffruitsize of a synthetic plant in the format of the csv files of this repository.
+    Fruits are on trusses 1 to ntruss, and leaves are kept on the upper half of the plant up to truss ntruss+1.
+    Sizes follow Gompertz curves of the development stage (approximated as 0.0181 per day at 20 C) with noise.
+
+    Arguments
+    --------
+    ntruss: integer
+        Number of fruit trusses.
+    nfruit: integer
+        Average number of fruits per truss.
+    ncompleaf: integer
+        ncompleaf given to shootappearance.dataset.
+    seed: integer
+        Seed of random numbers.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Fruit
+    idtruss = np.arange(1, ntruss+1)
+    nfruits = np.maximum(rng.integers(nfruit-3, nfruit+4, ntruss), 3)
+    dffruitnum = pd.DataFrame({'id_truss':idtruss, 'n_fruit':nfruits})
+    rows = []
+    for truss, n in zip(idtruss, nfruits):
+        for fruit in sorted({1, (n+1)//2, n}): # Proximal, middle and distal fruits are measured
+            age = (ntruss + 1 - truss) * 7 + fruit // 10
+            rows.append((truss, fruit, Gompertz(0.0181*age, 30, 2, 0.01) * rng.normal(1, 0.03)))
+    dffruitsize = pd.DataFrame(rows, columns=['id_truss','id_fruit','value'])
+
+    # Leaf
+    leaftruss = np.arange(max(ntruss//2, 1), ntruss+2)
+    dfleafnum = pd.DataFrame({'id_truss':leaftruss, 'n_leaf':3})
+    age = (leaftruss[-1] + ncompleaf - leaftruss) * 7
+    dfleafsize = pd.DataFrame({'id_truss':leaftruss, 'id_leaf':1, 'value':Gompertz(0.0181*age, 900, 5.5, 0.013) * rng.normal(1, 0.03, leaftruss.shape[0])})
+    return dfleafnum, dffruitnum, dfleafsize, dffruitsize
+
+def temperature(ndays=365, date='2024-01-01', seed=0, amplitude=4, noise=1.5):
+    """
+    Making dftemp of the ndays days before the measured date, with the format of dftemp.csv.
+    Temperature is 20 C plus a yearly sine of the amplitude and normal noise of the standard deviation noise.
+    """
+
+    rng = np.random.default_rng(seed)
+    enddate = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    dates = pd.date_range(end=enddate, periods=ndays+1, freq='D')
+    temp = 20 + amplitude * np.sin(np.arange(ndays+1) * 2 * np.pi / 365) + rng.normal(0, noise, ndays+1)
+    return pd.DataFrame({'Date':dates.strftime('%Y/%m/%d'), 'Temp':np.round(temp, 1)})
+
+def plants(nplant=10, ntruss=10, nfruit=15, ncompleaf=2, seed=0):
+    """
+    Long-format dfleafnum, dffruitnum, dfleafsize and dffruitsize of nplant plants with an 'id_plant' column, for shootappearance.batchdataset.
+    """
+
+    frames = [[], [], [], []]
+    for i in range(nplant):
+        for frame, df in zip(frames, plant(ntruss=ntruss, nfruit=nfruit, ncompleaf=ncompleaf, seed=seed+i)):
+            df.insert(0, 'id_plant', i)
+            frame.append(df)
+    return tuple(pd.concat(frame).reset_index(drop=True) for frame in frames)
@@ -1,3 +1,33 @@
-from .main import *
+# Names of the package are imported from their submodules on first use (PEP 562), so 'import shootappearance' does not import numpy, pandas or scipy.
+# e.g. shootappearance.dataset imports shootappearance.main (numpy and pandas), and scipy is imported only when a Gompertz curve is fitted with curve_fit.
+import importlib
 
+# Name -> submodule defining it
+_LAZY = {
+    'dataset': 'main', 'lrucache': 'main', 'trajectorycache': 'main', 'dvsicache': 'main', 'fitcache': 'main',
+    'dailytemp': 'climate',
+    'profiler': 'profiling',
+    'batchdataset': 'batch',
+    'initialvalues': 'runner', 'runpool': 'runner',
+    'pipeline': 'pipelines',
+    'sweep': 'sweeps',
+    'statefile': 'statefiles',
+    'organtable': 'organs',
+    'streamplants': 'stream',
+    'service': 'server',
+}
+
+__all__ = list(_LAZY)
 __version__ = '0.0.1'
+# Budget [s] of 'import shootappearance' in a new process, in addition to the start of Python. Checked by benchmarks/bench.py --check-import and tests/test_import.py.
+IMPORTBUDGET = 0.05
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Multi-plant variant of shootappearance.dataset (MIT license).
+import numpy as np
+import pandas as pd
+from .main import dataset
+from .climate import dailytemp
+from .profiling import profiled
+
+class batchdataset(dataset):
+    def __init__(self, dfleafnum, dffruitnum, dfleafsize, dffruitsize, colplant='id_plant', coltruss_dfleafnum='id_truss', colvalue_dfleafnum='n_leaf', coltruss_dffruitnum='id_truss', colvalue_dffruitnum='n_fruit', coltruss_dfleafsize='id_truss', colleaf_dfleafsize='id_leaf', colvalue_dfleafsize='value', coltruss_dffruitsize='id_truss', colfruit_dffruitsize='id_fruit', colvalue_dffruitsize='value', unit_leaf='cm2', unit_fruit='cm', ncompleaf=4, ncompfruit=1, profiler=None, inplace=False):
+        """
+        Dataset of many plants measured at once.
+        Input dataframes are in long format, i.e. the dataframes of shootappearance.dataset with an additional plant id column (colplant).
+        The stages initial_fruit and initial_leaf are inherited from dataset and run once over the rows of all the plants. DVSI runs once per measured date.
+        The other stages return the results of all the plants stacked in single dataframes or arrays.
+
+        Arguments
+        ----------
+        dfleafnum, dffruitnum, dfleafsize, dffruitsize: pandas dataframe
+            Same as shootappearance.dataset, with the plant id column.
+        colplant: string
+            Column name of plant id. The column is named 'id_plant' in the outputs.
+        coltruss_dfleafnum, colvalue_dfleafnum, coltruss_dffruitnum, colvalue_dffruitnum, coltruss_dfleafsize, colleaf_dfleafsize, colvalue_dfleafsize, coltruss_dffruitsize, colfruit_dffruitsize, colvalue_dffruitsize: string
+            Column names.
+        profiler, inplace:
+            Same as shootappearance.dataset.
+        """
+
+        super().__init__(
+            dfleafnum.rename(columns={colplant:'id_plant'}), dffruitnum.rename(columns={colplant:'id_plant'}), dfleafsize.rename(columns={colplant:'id_plant'}), dffruitsize.rename(columns={colplant:'id_plant'}),
+            coltruss_dfleafnum=coltruss_dfleafnum, colvalue_dfleafnum=colvalue_dfleafnum, coltruss_dffruitnum=coltruss_dffruitnum, colvalue_dffruitnum=colvalue_dffruitnum,
+            coltruss_dfleafsize=coltruss_dfleafsize, colleaf_dfleafsize=colleaf_dfleafsize, colvalue_dfleafsize=colvalue_dfleafsize,
+            coltruss_dffruitsize=coltruss_dffruitsize, colfruit_dffruitsize=colfruit_dffruitsize, colvalue_dffruitsize=colvalue_dffruitsize,
+            unit_leaf=unit_leaf, unit_fruit=unit_fruit, ncompleaf=ncompleaf, ncompfruit=ncompfruit, profiler=profiler, inplace=inplace)
+        self.nleaf = self.nleaf.sort_values(['id_plant','id_truss'], ascending=True)
+        self.nfruit = self.nfruit.sort_values(['id_plant','id_truss'], ascending=True)
+        self.leaf = self.leaf.sort_values(['id_plant','id_truss','id_leaf'], ascending=True)
+        self.fruit = self.fruit.sort_values(['id_plant','id_truss','id_fruit'], ascending=True)
+        self.plants = np.sort(pd.unique(self.nleaf['id_plant']))
+        self.plantframes = None # id_plant -> [dfleafnum, dffruitnum, dfleafsize, dffruitsize] of the plant, split on first use
+
+    def splitplants(self):
+        """
+        Splitting the four long dataframes into the dataframes of each plant in one groupby per dataframe.
+        """
+
+        if self.plantframes is None:
+            frames = [self.nleaf, self.nfruit, self.leaf, self.fruit]
+            self.plantframes = {idplant: [df.iloc[:0].drop(columns='id_plant') for df in frames] for idplant in self.plants}
+            for i, df in enumerate(frames):
+                for idplant, group in df.groupby('id_plant', sort=False):
+                    if idplant in self.plantframes:
+                        self.plantframes[idplant][i] = group.drop(columns='id_plant').reset_index(drop=True)
+        return self.plantframes
+
+    def plant(self, idplant):
+        """
+        Single-plant dataset of a plant. The values are already converted to m2 (leaf) and cm (fruit).
+        """
+
+        return dataset(*self.splitplants()[idplant], unit_leaf='m2', unit_fruit='cm', ncompleaf=self.ncompleaf, ncompfruit=self.ncompfruit)
+
+    @profiled
+    def complement(self, date, maxfruitsonbranch=10, nfruit=np.nan):
+        """
+        Complementing the sizes of the fruits and leaves of all the plants.
+
+        Arguments
+        --------
+        date: string or dict
+            The date when the plant appearance measured. Format should be '%Y-%m-%d', e.g. '2024-01-01'
+            A dict {plant id: date} is used if the plants were measured on different dates. Then give dfplant.set_index('id_plant')['measureddate'] to 'def DVSI()' as measureddate.
+        maxfruitsonbranch, nfruit:
+            Same as shootappearance.dataset.complement.
+
+        Outputs
+        --------
+        dfplant: pandas DataFrame
+            One row per plant with the columns id_plant, nleafonplant, nfruitave, nbranchontruss, DVS and measureddate.
+        compleaf, compfruit: pandas DataFrame
+            self.compleaf and self.compfruit of all the plants stacked with the id_plant column.
+        """
+
+        rows = []
+        compleafs = []
+        compfruits = []
+        for idplant in self.plants:
+            _date = date[idplant] if isinstance(date, dict) else date
+            nleafonplant, nfruitave, nbranchontruss, compleaf, compfruit, DVS, measureddate = self.plant(idplant).complement(_date, maxfruitsonbranch=maxfruitsonbranch, nfruit=nfruit)
+            rows.append({'id_plant':idplant, 'nleafonplant':nleafonplant, 'nfruitave':nfruitave, 'nbranchontruss':nbranchontruss, 'DVS':DVS, 'measureddate':measureddate})
+            compleaf.insert(0, 'id_plant', idplant)
+            compfruit.insert(0, 'id_plant', idplant)
+            compleafs.append(compleaf)
+            compfruits.append(compfruit)
+        dfplant = pd.DataFrame(rows)
+        self.compleaf = pd.concat(compleafs).reset_index(drop=True)
+        self.compfruit = pd.concat(compfruits).reset_index(drop=True)
+        return dfplant, self.compleaf, self.compfruit
+
+    @profiled
+    def DVSI(self, dfcomp, coldoe, coldvsi, measureddate, dftemp, coldate, coltemp, cache=True, previous=None, previousdate=None):
+        """
+        DVSI of the organs of all the plants. The organs of the plants measured on the same date are integrated at once.
+
+        Arguments
+        --------
+        dfcomp: pandas DataFrame
+            compleaf or compfruit output in 'def complement()', including id_plant.
+        measureddate: datetime.date, dict or pandas Series
+            Measured date of all the plants, or measured date of each plant as {plant id: date} or a Series indexed by id_plant (e.g. dfplant.set_index('id_plant')['measureddate']).
+        coldoe, coldvsi, dftemp, coldate, coltemp, cache, previous, previousdate:
+            Same as shootappearance.dataset.DVSI. previous is supported only with a single measured date.
+        """
+
+        if not isinstance(measureddate, (dict, pd.Series)):
+            return super().DVSI(dfcomp, coldoe, coldvsi, measureddate, dftemp, coldate, coltemp, cache=cache, previous=previous, previousdate=previousdate)
+        if previous is not None:
+            raise ValueError('previous is supported only with a single measured date.')
+        if isinstance(dftemp, dailytemp):
+            self.temp = dftemp
+        else:
+            self.temp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+
+        measureddate = pd.Series(measureddate, dtype=object)
+        idplant = dfcomp['id_plant'].to_numpy()
+        notfound = np.setdiff1d(pd.unique(idplant), measureddate.index.to_numpy())
+        if notfound.shape[0] > 0:
+            raise KeyError('Measured dates of plants %s are not given.' % list(notfound))
+        rowdates = measureddate.reindex(idplant).to_numpy()
+        DVSI = np.zeros(dfcomp.shape[0])
+        for date in pd.unique(rowdates):
+            rows = rowdates == date
+            DVSI[rows] = self.DVSI_array(doe=dfcomp[coldoe].to_numpy()[rows], measureddate=date, date=self.temp.day, temp=self.temp.temp, cache=cache, fingerprint=self.temp.fingerprint)
+        self.compdvsi = self.withcolumns(dfcomp, **{coldvsi: DVSI})
+        return self.compdvsi
+
+    @profiled
+    def Gompertz_fit(self, df, x, y, inib, inic, p0=None, cache=True):
+        """
+        Gompertz curve fitting of each plant.
+        The curves of all the plants are fitted in one batched call of 'def Gompertz_fits()'. Curves which did not converge do not raise an error and are reported in self.fitdiagnostics.
+
+        Arguments
+        --------
+        df: pandas DataFrame
+            Data of all the plants including id_plant, a explanatory variable (x) and an objective variable (y) for training.
+        x, y, inib, inic:
+            Same as shootappearance.dataset.Gompertz_fit.
+        p0: array-like or pandas DataFrame
+            Warm-start values of [a, b, c]. An array of shape (3,) is a population prior used for all the plants, and a DataFrame indexed by id_plant with the columns a, b and c (e.g. popt of a previous fit) gives the values of each plant. Plants without values use [mean of y, inib, inic].
+        cache: bool
+            Same as shootappearance.dataset.Gompertz_fits.
+
+        Outputs
+        --------
+        popt: pandas DataFrame
+            Gompertz parameters a, b and c indexed by id_plant.
+        pcov: numpy array
+            Covariance of the parameters, shape (number of plants, 3, 3).
+        ymax: pandas Series
+            Maximum y of each plant.
+        """
+
+        df_train = df[['id_plant',x,y]].dropna(subset=[y])
+        plants = np.sort(pd.unique(df_train['id_plant']))
+        grouped = df_train.groupby('id_plant')
+        ymax = grouped[y].max()
+        if isinstance(p0, pd.DataFrame):
+            p0 = p0.reindex(plants)[['a','b','c']].to_numpy(dtype=float)
+        popt, pcov, diagnostics = self.Gompertz_fits([group[x] for idplant, group in grouped], [group[y] for idplant, group in grouped], inib, inic, p0=p0, cache=cache)
+        diagnostics.index = pd.Index(plants, name='id_plant')
+        self.fitdiagnostics = diagnostics
+        popt = pd.DataFrame(popt, index=pd.Index(plants, name='id_plant'), columns=['a','b','c'])
+        return popt, pcov, ymax
+
+    @profiled
+    def interpolate_and_Gompertz_est(self, df, colx, coly, Gompparams):
+        """
+        Interpolating and estimating the sizes of all the plants at once.
+
+        Arguments
+        --------
+        df: pandas DataFrame
+            Output of DVSI including id_plant.
+        colx, coly: string
+            Same as shootappearance.dataset.interpolate_and_Gompertz_est.
+        Gompparams: pandas DataFrame
+            popt output in 'def Gompertz_fit()', indexed by id_plant.
+        """
+
+        interpolatedvalue = df.groupby('id_plant', sort=False)[coly].transform(lambda x: x.interpolate())
+        params = Gompparams.reindex(df['id_plant']).to_numpy()
+        estimatedvalue = self.Gompertz(df[colx].to_numpy(dtype=float), params[:,0], params[:,1], params[:,2])
+        value = df[coly].to_numpy(dtype=float, copy=True)
+        missing = np.isnan(value)
+        interpolated = missing & (df['method'] == 'interpolated').to_numpy()
+        complemented = missing & (df['method'] == 'complemented').to_numpy()
+        value[interpolated] = interpolatedvalue.to_numpy()[interpolated]
+        value[complemented] = estimatedvalue[complemented]
+        return self.withcolumns(df, **{coly: value})
+
+    @profiled
+    def twoddf(self, df, coltruss, colindiv, colvalue, idtrussmax=60):
+        """
+        Making a 3d array (plant x truss x leaf or fruit) of all the plants.
+        Cells without leaves or fruits are NaN (NaT for dates).
+
+        Arguments
+        ----------
+        idtrussmax: integer
+            Number of trusses = Number of rows of the 2d table of each plant.
+
+        Outputs
+        --------
+        plants: numpy array
+            Plant ids, in the order of the first axis.
+        array3d: numpy array
+            Shape (number of plants, idtrussmax, maximum id of leaf or fruit). The element [p, i, j] is the value of truss i+1 and leaf or fruit j+1 of plants[p].
+        """
+
+        plants, arrays = self.twoddfs(df, coltruss, colindiv, [colvalue], idtrussmax=idtrussmax)
+        return plants, arrays[colvalue]
+
+    @profiled
+    def twoddfs(self, df, coltruss, colindiv, colvalues, idtrussmax=60, output='array'):
+        """
+        Making the 3d arrays (plant x truss x leaf or fruit) of many value columns of all the plants in one pass.
+
+        Arguments
+        ----------
+        colvalues: list of string
+            Column names of values, e.g. ['FF', 'FD', 'DOEF', 'DVSF'].
+        idtrussmax: integer
+            Number of trusses = Number of rows of the 2d table of each plant.
+        output: string
+            Only 'array' is supported, because the tables of many plants do not fit the 2d layout of shootappearance.dataset.twoddfs.
+
+        Outputs
+        --------
+        plants: numpy array
+            Plant ids, in the order of the first axis.
+        arrays: dict
+            {column name: 3d numpy array} as array3d of 'def twoddf()'. Dates are datetime64[D] with NaT in empty cells.
+        """
+
+        if output != 'array':
+            raise ValueError("batchdataset.twoddfs supports only output='array'.")
+        _df = df.rename(columns={coltruss:'id_truss'})
+        _df = _df[_df['id_truss'] <= idtrussmax]
+        plants = np.sort(pd.unique(_df['id_plant']))
+        nmax = int(_df[colindiv].max())
+        iplant = np.searchsorted(plants, _df['id_plant'].to_numpy())
+        itruss = _df['id_truss'].to_numpy().astype(int) - 1
+        iindiv = _df[colindiv].to_numpy().astype(int) - 1
+        arrays = {}
+        for colvalue in colvalues:
+            value = _df[colvalue]
+            if pd.api.types.is_numeric_dtype(value):
+                array3d = np.full((plants.shape[0], idtrussmax, nmax), np.nan)
+                array3d[iplant, itruss, iindiv] = value.to_numpy(dtype=float)
+            else: # Dates (e.g. DOEF, DOEL)
+                array3d = np.full((plants.shape[0], idtrussmax, nmax), np.datetime64('NaT'), dtype='datetime64[D]')
+                array3d[iplant, itruss, iindiv] = value.to_numpy().astype('datetime64[D]')
+            arrays[colvalue] = array3d
+        return plants, arrays
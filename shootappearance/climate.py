@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Daily temperature input of shootappearance.dataset.DVSI (MIT license).
+import collections
+import hashlib
+import numpy as np
+import pandas as pd
+
+def _todatetime(values, format=None):
+    """
+    Dates parsed by vectorized pandas.to_datetime. If format is None and the values have more than one format (e.g. '2023/10/20' and '2023-10-21'), each value is parsed separately.
+    """
+
+    if format is not None:
+        return pd.to_datetime(values, format=format)
+    try:
+        return pd.to_datetime(values)
+    except ValueError:
+        return pd.to_datetime(values, format='mixed')
+
+class dailytemp:
+    def __init__(self, date, temp):
+        """
+        Daily average temperature series indexed by date.
+        Dates are parsed once and kept as numbers of days since 1970-01-01, so the series can be reused by many DVSI calls without parsing again.
+        Days (int64) and temperatures (float64) already sorted by date are kept without copying, e.g. the memory-mapped arrays of 'def load()'.
+
+        Arguments
+        ----------
+        date: array-like
+            Dates (datetime.date, numpy datetime64 or strings such as '2023/10/20').
+        temp: array-like of float
+            Daily average temperature [C].
+        """
+
+        date = np.asarray(date)
+        if date.dtype.kind not in 'Mi':
+            date = _todatetime(pd.Series(date)).to_numpy()
+        if date.dtype == np.int64:
+            self.day = date
+        else:
+            self.day = date.astype('datetime64[D]').astype(np.int64)
+        self.temp = np.asarray(temp, dtype=float)
+        step = np.diff(self.day)
+        if np.any(step < 0):
+            order = np.argsort(self.day, kind='stable')
+            self.day = self.day[order]
+            self.temp = self.temp[order]
+            step = np.diff(self.day)
+        if np.any(step == 0):
+            raise ValueError('Temperature data contain duplicated dates.')
+        digest = hashlib.sha1()
+        digest.update(self.day.tobytes())
+        digest.update(self.temp.tobytes())
+        self.fingerprint = digest.hexdigest()
+
+    @property
+    def date(self):
+        """Dates as numpy datetime64[D]."""
+        return self.day.astype('datetime64[D]')
+
+    @classmethod
+    def fromdataframe(cls, df, coldate='Date', coltemp='Temp', format=None):
+        """
+        From a dataframe like dftemp.csv. The date column is parsed with vectorized pandas.to_datetime (format e.g. '%Y/%m/%d'). If format is None, it is inferred, and dates of mixed formats are parsed one by one.
+        """
+
+        return cls(_todatetime(df[coldate], format=format).to_numpy(), df[coltemp].to_numpy(dtype=float))
+
+    @classmethod
+    def fromarrow(cls, table, coldate='Date', coltemp='Temp'):
+        """
+        From a pyarrow Table with a date (or timestamp) column and a temperature column.
+        """
+
+        return cls(table.column(coldate).to_numpy(), table.column(coltemp).to_numpy())
+
+    @classmethod
+    def readcsv(cls, path, coldate='Date', coltemp='Temp', format=None, **kwargs):
+        """
+        From a csv file of daily temperature like dftemp.csv. kwargs are passed to pandas.read_csv.
+        """
+
+        df = pd.read_csv(path, usecols=[coldate, coltemp], encoding=kwargs.pop('encoding', 'utf-8-sig'), **kwargs)
+        return cls.fromdataframe(df, coldate, coltemp, format=format)
+
+    @classmethod
+    def readparquet(cls, path, coldate='Date', coltemp='Temp', format=None):
+        """
+        From a Parquet file of daily temperature. pyarrow (or fastparquet) is required.
+        """
+
+        df = pd.read_parquet(path, columns=[coldate, coltemp])
+        return cls.fromdataframe(df, coldate, coltemp, format=format)
+
+    def save(self, path):
+        """
+        Saving as a .npy file of a structured array (fields 'day' and 'temp'), which can be memory-mapped by 'def load()'.
+        """
+
+        array = np.empty(self.day.shape[0], dtype=[('day', np.int64), ('temp', float)])
+        array['day'] = self.day
+        array['temp'] = self.temp
+        np.save(path, array)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loading a .npy file written by 'def save()'. If mmap is True, the file is memory-mapped instead of read at once.
+        """
+
+        array = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(array['day'], array['temp'])
+
+    @classmethod
+    def aggregatelog(cls, path, coldatetime='Datetime', coltemp='Temp', chunksize=100000, format=None, **kwargs):
+        """
+        Daily average temperature from a raw greenhouse log (e.g. hourly or 5-minute records) in a csv file.
+        The file is read in chunks of 'chunksize' rows, and only the daily sums and counts are kept, so the whole file is never loaded into memory.
+
+        Arguments
+        ----------
+        path: string
+            Path of the csv file.
+        coldatetime: string
+            Column name of date and time of records.
+        coltemp: string
+            Column name of temperature. Missing values are ignored.
+        chunksize: integer
+            Number of rows read at once.
+        format: string
+            Format of date and time, e.g. '%Y/%m/%d %H:%M'. If None, it is inferred (for each chunk), and dates of mixed formats are parsed one by one.
+        kwargs:
+            Other arguments of pandas.read_csv.
+        """
+
+        sums = collections.defaultdict(float)
+        counts = collections.defaultdict(int)
+        for chunk in pd.read_csv(path, usecols=[coldatetime, coltemp], chunksize=chunksize, encoding=kwargs.pop('encoding', 'utf-8-sig'), **kwargs):
+            chunk = chunk.dropna(subset=[coltemp])
+            day = _todatetime(chunk[coldatetime], format=format).to_numpy().astype('datetime64[D]').astype(np.int64)
+            uniqueday, inverse = np.unique(day, return_inverse=True)
+            chunksum = np.bincount(inverse, weights=chunk[coltemp].to_numpy(dtype=float), minlength=uniqueday.shape[0])
+            chunkcount = np.bincount(inverse, minlength=uniqueday.shape[0])
+            for d, s, c in zip(uniqueday.tolist(), chunksum.tolist(), chunkcount.tolist()):
+                sums[d] += s
+                counts[d] += c
+        day = np.array(sorted(sums), dtype=np.int64)
+        temp = np.array([sums[d] / counts[d] for d in day.tolist()])
+        return cls(day, temp)
@@ -3,16 +3,75 @@
 # This is an original work by Fujiuchi (MIT license).
 import math
 import statistics
-import copy
 import itertools
+import collections
+import hashlib
 import datetime
 import numpy as np
 import pandas as pd
-from scipy.optimize import curve_fit
-from dateutil import parser
+from .climate import dailytemp
+from .profiling import profiled
+from .organs import organtable
+
+class lrucache:
+    """
+    LRU cache with hit/miss counters, shared by all the dataset instances in a process.
+
+    Arguments
+    ----------
+    maxsize: integer
+        Maximum number of values kept. The least recently used value is evicted first.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.store = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.store:
+            self.store.move_to_end(key)
+            self.hits += 1
+            return self.store[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.store[key] = value
+        self.store.move_to_end(key)
+        while len(self.store) > self.maxsize:
+            self.store.popitem(last=False)
+
+    def info(self):
+        """Hit/miss counters and current size of the cache."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.store), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self.store.clear()
+        self.hits = 0
+        self.misses = 0
+
+class trajectorycache(lrucache):
+    """
+    LRU cache of DVSI trajectories.
+    A key is (emergence day, measured day, fingerprint of the temperature series), where days are numbers of days since 1970-01-01, and a value is the DVSI at the measured day.
+    """
+
+    def fingerprint(self, day, value):
+        """Hash of a temperature series given as day numbers and temperatures."""
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(day, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(value, dtype=float).tobytes())
+        return digest.hexdigest()
+
+dvsicache = trajectorycache()
+
+# LRU cache of Gompertz fits. A key is a hash of the training data, initial values and maxfev, and a value is (popt, pcov, diagnostics).
+fitcache = lrucache(maxsize=16384)
 
 class dataset:
-    def __init__(self, dfleafnum, dffruitnum, dfleafsize, dffruitsize, coltruss_dfleafnum='id_truss', colvalue_dfleafnum='n_leaf', coltruss_dffruitnum='id_truss', colvalue_dffruitnum='n_fruit', coltruss_dfleafsize='id_truss', colleaf_dfleafsize='id_leaf', colvalue_dfleafsize='value', coltruss_dffruitsize='id_truss', colfruit_dffruitsize='id_fruit', colvalue_dffruitsize='value', unit_leaf='cm2', unit_fruit='cm', ncompleaf=4, ncompfruit=1):
+    def __init__(self, dfleafnum, dffruitnum, dfleafsize, dffruitsize, coltruss_dfleafnum='id_truss', colvalue_dfleafnum='n_leaf', coltruss_dffruitnum='id_truss', colvalue_dffruitnum='n_fruit', coltruss_dfleafsize='id_truss', colleaf_dfleafsize='id_leaf', colvalue_dfleafsize='value', coltruss_dffruitsize='id_truss', colfruit_dffruitsize='id_fruit', colvalue_dffruitsize='value', unit_leaf='cm2', unit_fruit='cm', ncompleaf=4, ncompfruit=1, profiler=None, inplace=False):
         """
         Arguments
         ----------
@@ -40,23 +99,26 @@ class dataset:
             Don't contain "None" or "NaN" values.
         coltruss_dfleafnum, colvalue_dfleafnum, coltruss_dffruitnum, colvalue_dffruitnum, coltruss_dfleafsize, colleaf_dfleafsize, colvalue_dfleafsize, coltruss_dffruitsize, colfruit_dffruitsize, colvalue_dffruitsize: string
             Column names.
+        profiler: shootappearance.profiler
+            If given, metrics of every stage are recorded in it. None (default) disables profiling.
+        inplace: bool
+            If False (default), the stages DVSI, interpolate_and_Gompertz_est, initial_fruit and initial_leaf return a new organ table and do not change the input. A shootappearance.organtable shares the unchanged (read-only) columns of the input, and a dataframe is copied (unless pandas copy-on-write is enabled by pd.options.mode.copy_on_write = True).
+            If True, they add their columns to the input table itself.
         """
 
-        self.ncompleaf = copy.deepcopy(ncompleaf) # The number of trusses which will be complemented for leaves above the uppermost measured leaf
-        self.ncompfruit = copy.deepcopy(ncompfruit) # The number of trusses which will be complemented for fruits above the uppermost measured leaf
+        self.profiler = profiler
+        self.inplace = inplace
+        self.ncompleaf = ncompleaf # The number of trusses which will be complemented for leaves above the uppermost measured leaf
+        self.ncompfruit = ncompfruit # The number of trusses which will be complemented for fruits above the uppermost measured leaf
 
-        # copying input dataframes
-        self.nleaf = copy.deepcopy(dfleafnum)
-        self.nleaf = self.nleaf.rename(columns={coltruss_dfleafnum:'id_truss', colvalue_dfleafnum:'n_leaf'})
+        # Input dataframes are not changed, because rename and sort_values make new dataframes
+        self.nleaf = dfleafnum.rename(columns={coltruss_dfleafnum:'id_truss', colvalue_dfleafnum:'n_leaf'})
         self.nleaf = self.nleaf.sort_values(['id_truss'], ascending=True)
-        self.nfruit = copy.deepcopy(dffruitnum)
-        self.nfruit = self.nfruit.rename(columns={coltruss_dffruitnum:'id_truss', colvalue_dffruitnum:'n_fruit'})
+        self.nfruit = dffruitnum.rename(columns={coltruss_dffruitnum:'id_truss', colvalue_dffruitnum:'n_fruit'})
         self.nfruit = self.nfruit.sort_values(['id_truss'], ascending=True)
-        self.leaf = copy.deepcopy(dfleafsize)
-        self.leaf = self.leaf.rename(columns={coltruss_dfleafsize:'id_truss', colleaf_dfleafsize:'id_leaf', colvalue_dfleafsize:'value'})
+        self.leaf = dfleafsize.rename(columns={coltruss_dfleafsize:'id_truss', colleaf_dfleafsize:'id_leaf', colvalue_dfleafsize:'value'})
         self.leaf = self.leaf.sort_values(['id_truss','id_leaf'], ascending=True)
-        self.fruit = copy.deepcopy(dffruitsize)
-        self.fruit = self.fruit.rename(columns={coltruss_dffruitsize:'id_truss', colfruit_dffruitsize:'id_fruit', colvalue_dffruitsize:'value'})
+        self.fruit = dffruitsize.rename(columns={coltruss_dffruitsize:'id_truss', colfruit_dffruitsize:'id_fruit', colvalue_dffruitsize:'value'})
         self.fruit = self.fruit.sort_values(['id_truss','id_fruit'], ascending=True)
 
         # Value of dfleafsize will be used as leaf area [m2]
@@ -89,6 +151,7 @@ class dataset:
     #     self.gridfruit = pd.merge(self.gridfruit, self.fruit, how='left')
     #     self.gridfruit2d = self.gridfruit.set_index(['id_truss','id_fruit']).unstack('id_fruit').value.rename_axis([None],axis=1).reset_index()
 
+    @profiled
     def twoddf(self, df, coltruss, colindiv, colvalue, idtrussmax=60):
         """
         Making a dataframe based on the number of leaves and fruits.
@@ -99,14 +162,89 @@ class dataset:
             Number of trusses = Number of rows of 2d table.
         """
 
-        _df = df.rename(columns={coltruss:'id_truss'})
-        nmax = int(_df[colindiv].max())
-        grid = self.expand_grid({'id_truss': range(1,idtrussmax+1), colindiv: range(1,nmax+1)})        
-        grid = pd.merge(grid, _df, how='left').filter(['id_truss', colindiv, colvalue])
-        grid2d = grid.set_index(['id_truss',colindiv]).unstack(colindiv)[colvalue].rename_axis([None],axis=1).reset_index()
+        grid2d = self.twoddfs(df, coltruss, colindiv, [colvalue], idtrussmax=idtrussmax, output='dataframe')[colvalue]
         return grid2d
 
-    def complement(self, date, maxfruitsonbranch=10, nfruit=np.nan):
+    @profiled
+    def twoddfs(self, df, coltruss, colindiv, colvalues, idtrussmax=60, output='array'):
+        """
+        Making the 2d tables of many value columns in one pass.
+        The (truss, leaf or fruit) cell of each row is computed once, and the values of every column are scattered into preallocated arrays.
+
+        Arguments
+        ----------
+        coltruss: string
+            Column name of truss id.
+        colindiv: string
+            Column name of leaf id or fruit id.
+        colvalues: list of string
+            Column names of values, e.g. ['FF', 'FD', 'DOEF', 'DVSF'].
+        idtrussmax: integer
+            Number of trusses = Number of rows of 2d table.
+        output: string
+            'array': dict {column name: 2d numpy array} with shape (idtrussmax, maximum id of leaf or fruit). Empty cells of numeric columns are NaN, and other columns (e.g. dates) are object arrays with NaN in empty cells. Dates of a shootappearance.organtable are datetime64 arrays with NaT in empty cells.
+            'stack': 3d numpy array of float with shape (len(colvalues), idtrussmax, maximum id of leaf or fruit). All the columns must be numeric.
+            'dataframe': dict {column name: pandas DataFrame} in the layout of 'def twoddf()'.
+        """
+
+        itruss = np.asarray(df[coltruss]).astype(int) - 1
+        iindiv = np.asarray(df[colindiv]).astype(int) - 1
+        nmax = int(iindiv.max()) + 1
+        intable = (itruss >= 0) & (itruss < idtrussmax)
+        itruss = itruss[intable]
+        iindiv = iindiv[intable]
+
+        if output == 'stack':
+            stack = np.full((len(colvalues), idtrussmax, nmax), np.nan)
+            for i, colvalue in enumerate(colvalues):
+                stack[i, itruss, iindiv] = np.asarray(df[colvalue], dtype=float)[intable]
+            return stack
+
+        tables = {}
+        for colvalue in colvalues:
+            values = np.asarray(df[colvalue])
+            if values.dtype.kind == 'M': # Dates of an organtable
+                table = np.full((idtrussmax, nmax), np.datetime64('NaT'), dtype=values.dtype)
+            elif pd.api.types.is_numeric_dtype(values):
+                table = np.full((idtrussmax, nmax), np.nan)
+            else:
+                table = np.full((idtrussmax, nmax), np.nan, dtype=object)
+            table[itruss, iindiv] = values[intable]
+            if output == 'dataframe':
+                table = pd.DataFrame(table, columns=range(1,nmax+1))
+                table.insert(0, 'id_truss', np.arange(1,idtrussmax+1))
+            tables[colvalue] = table
+        return tables
+
+    def organgrid(self, idtruss, norgan):
+        """
+        Making rows of all the combination of truss id and organ (leaf or fruit) id, where the truss idtruss[i] has norgan[i] organs with ids 1 to norgan[i].
+        The rows are built with np.repeat and np.arange, so the cost is linear in the number of organs.
+
+        Outputs
+        --------
+        idtrussarray, idorganarray: numpy array of float
+            Truss id and organ id of each row.
+        """
+
+        idtruss = np.asarray(idtruss)
+        norgan = np.asarray(norgan).astype(int)
+        idtrussarray = np.repeat(idtruss, norgan).astype(float)
+        firstrow = np.repeat(np.cumsum(norgan) - norgan, norgan) # Row number of the first organ of the truss of each row
+        idorganarray = (np.arange(norgan.sum()) - firstrow + 1).astype(float)
+        return idtrussarray, idorganarray
+
+    def daysbefore(self, date, days, asobject=True):
+        """
+        Dates 'days' days before 'date' as datetime.date objects (or numpy datetime64[D] if asobject is False). Fractional days are truncated like int().
+        """
+
+        delta = np.trunc(np.asarray(days, dtype=float)).astype(np.int64).astype('timedelta64[D]')
+        dates = np.datetime64(date, 'D') - delta
+        return dates.astype(object) if asobject else dates
+
+    @profiled
+    def complement(self, date, maxfruitsonbranch=10, nfruit=np.nan, asorgans=False):
         """
         Complementing the sizes of the fruits and leaves that existed but were not measured.
 
@@ -118,6 +256,8 @@ class dataset:
             Maximum number of fruits on a branch in a truss is 10 (default).
         nfruit: integer
             Number of fruits on each complemented truss. If a value is np.nan, average number of fruits on measured trusses is uses.
+        asorgans: bool
+            If True, compleaf and compfruit are returned as shootappearance.organtable (typed columns, datetime64 dates and categorical method) instead of dataframes.
 
         Outputs
         --------
@@ -146,12 +286,7 @@ class dataset:
         topleafpos = float(topleafpos) + 0.001
 
         # Interpolating leaf measured data
-        idtrussarray = []
-        idleafarray = []
-        for i in range(0, self.nleaf.shape[0]): # Making as rows of all the combination of id_truss and id_leaf included in the nleaf dataframe.
-            appendarray = [self.nleaf['id_truss'][i]] * self.nleaf['n_leaf'][i]
-            idtrussarray = np.concatenate([idtrussarray, appendarray])
-            idleafarray = np.concatenate([idleafarray, range(1,int(self.nleaf['n_leaf'][i])+1)])
+        idtrussarray, idleafarray = self.organgrid(self.nleaf['id_truss'], self.nleaf['n_leaf']) # Making as rows of all the combination of id_truss and id_leaf included in the nleaf dataframe.
         leafdfform = pd.DataFrame({'id_truss': idtrussarray, 'id_leaf': idleafarray})
         self.leaf['method'] = 'measured'
         self.leaf = pd.merge(leafdfform, self.leaf, how='left')
@@ -160,9 +295,8 @@ class dataset:
         self.leaf['method'] = self.leaf['method'].replace({np.nan:'interpolated'})
 
         # Leaf complementing data
-        compleafmeasuredtoptruss = self.expand_grid({'id_truss': range(int(measuredtopleaf.id_truss),int(measuredtopleaf.id_truss)+1), 'id_leaf': range(1,int(self.nleaf.tail(1)['n_leaf'])+1)})
-        self.compleaf = self.expand_grid({'id_truss': range(int(measuredtopleaf.id_truss+1),int(topleaf.id_truss+1)), 'id_leaf': range(1,nleafave+1)})
-        self.compleaf = pd.concat([compleafmeasuredtoptruss, self.compleaf]).reset_index(drop=True)
+        idtrussarray, idleafarray = self.organgrid(np.arange(int(measuredtopleaf.id_truss),max(int(topleaf.id_truss),int(measuredtopleaf.id_truss))+1), np.r_[int(self.nleaf.tail(1)['n_leaf']), np.full(max(int(topleaf.id_truss)-int(measuredtopleaf.id_truss), 0), nleafave)]) # The measured top truss with its leaf number, and the trusses above it with nleafave leaves.
+        self.compleaf = pd.DataFrame({'id_truss': idtrussarray, 'id_leaf': idleafarray})
         self.compleaf['pos'] = (self.compleaf.id_truss-1) + (self.compleaf.id_leaf-1) * (1/3)
         self.compleaf['method'] = 'complemented'
         self.compleaf = self.compleaf[(self.compleaf['pos']>=measuredtopleafpos)]
@@ -174,7 +308,7 @@ class dataset:
 
         # Adding leaf information required for initializing TOMULATION
         self.compleaf['LVAGE'] = (int(topleaf.id_truss) - self.compleaf.id_truss) * 7 + (int(topleaf.id_leaf) - self.compleaf.id_leaf) * 1/3 * 7
-        self.compleaf['DOEL'] = self.compleaf['LVAGE'].apply(lambda x: measureddate - datetime.timedelta(days=int(x)))
+        self.compleaf['DOEL'] = self.daysbefore(measureddate, self.compleaf['LVAGE'], asobject=not asorgans)
 
         # Fruit
         measuredtopfruit = self.fruit.tail(1)
@@ -194,23 +328,18 @@ class dataset:
         topfruitpos = DVS + 0.001
 
         # Interpolating fruit measured data
-        idtrussarray = []
-        idfruitarray = []
-        for i in range(0, self.nfruit.shape[0]): # Making as rows of all the combination of id_truss and id_fruits included in the nfruit dataframe.
-            appendarray = [self.nfruit['id_truss'][i]] * self.nfruit['n_fruit'][i]
-            idtrussarray = np.concatenate([idtrussarray, appendarray])
-            idfruitarray = np.concatenate([idfruitarray, range(1,int(self.nfruit['n_fruit'][i])+1)])
+        idtrussarray, idfruitarray = self.organgrid(self.nfruit['id_truss'], self.nfruit['n_fruit']) # Making as rows of all the combination of id_truss and id_fruits included in the nfruit dataframe.
         fruitdfform = pd.DataFrame({'id_truss': idtrussarray, 'id_fruit': idfruitarray})
         self.fruit['method'] = 'measured'
         self.fruit = pd.merge(fruitdfform, self.fruit, how='left')
         self.fruit['method'] = self.fruit['method'].replace({np.nan:'interpolated'})
 
         # Fruit complementing data
-        compfruitmeasuredtoptruss = self.expand_grid({'id_truss': range(int(measuredtopfruit.id_truss),int(measuredtopfruit.id_truss)+1), 'id_fruit': range(1,int(self.nfruit.tail(1)['n_fruit'])+1)})
-        compfruitmeasuredtoptruss['pos'] = compfruitmeasuredtoptruss.id_truss + (compfruitmeasuredtoptruss.id_fruit-1) * (1/int(self.nfruit.tail(1)['n_fruit']))
-        self.compfruit = self.expand_grid({'id_truss': range(int(measuredtopfruit.id_truss+1),int(topfruit.id_truss+1)), 'id_fruit': range(1,nfruitave+1)})
-        self.compfruit['pos'] = self.compfruit.id_truss + (self.compfruit.id_fruit-1) * (1/nfruitave)
-        self.compfruit = pd.concat([compfruitmeasuredtoptruss, self.compfruit]).reset_index(drop=True)
+        nfruittoptruss = int(self.nfruit.tail(1)['n_fruit'])
+        ntruss = max(int(topfruit.id_truss) - int(measuredtopfruit.id_truss), 0)
+        idtrussarray, idfruitarray = self.organgrid(np.arange(int(measuredtopfruit.id_truss),int(measuredtopfruit.id_truss)+ntruss+1), np.r_[nfruittoptruss, np.full(ntruss, nfruitave)]) # The measured top truss with its fruit number, and the trusses above it with nfruitave fruits.
+        self.compfruit = pd.DataFrame({'id_truss': idtrussarray, 'id_fruit': idfruitarray})
+        self.compfruit['pos'] = self.compfruit.id_truss + (self.compfruit.id_fruit-1) * np.where(self.compfruit.id_truss==int(measuredtopfruit.id_truss), 1/nfruittoptruss, 1/nfruitave)
         self.compfruit['method'] = 'complemented'
         self.compfruit = self.compfruit[(self.compfruit['pos']>=measuredtopfruitpos)]
         self.compfruit = self.compfruit[(self.compfruit['pos']<=topfruitpos)]
@@ -228,17 +357,31 @@ class dataset:
         self.compfruit['order'] = (self.compfruit.id_fruit - 1) // self.compfruit.n_branch + 1 # e.g. if id_fruit=3 and nbranchontruss=3, then order=1. If id_fruit=4 and nbranchontruss=3, then order=2.
         topfruit['order'] = (topfruit.id_fruit - 1) // nbranchontruss + 1
         self.compfruit['FAGE'] = (int(topfruit.id_truss) - self.compfruit.id_truss) * 7 + (int(topfruit.order) - self.compfruit.order)
-        self.compfruit['DOEF'] = self.compfruit['FAGE'].apply(lambda x: measureddate - datetime.timedelta(days=int(x)))
+        self.compfruit['DOEF'] = self.daysbefore(measureddate, self.compfruit['FAGE'], asobject=not asorgans)
 
+        if asorgans:
+            self.compleaf = organtable.fromdataframe(self.compleaf)
+            self.compfruit = organtable.fromdataframe(self.compfruit)
         return nleafonplant, nfruitave, nbranchontruss, self.compleaf, self.compfruit, DVS, measureddate
     
     def Gompertz(self, t, a, b, c):
         f = a * np.exp(-b * c**t)
         return f
 
-    def Gompertz_fit(self, df, x, y, inib, inic):
+    def Gompertz_jac(self, t, a, b, c):
+        """
+        Analytic Jacobian of the Gompertz curve with respect to (a, b, c). The last axis is the parameter.
+        """
+
+        ct = c**t
+        e = np.exp(-b * ct)
+        return np.stack(np.broadcast_arrays(e, -a * ct * e, -a * b * t * c**(t-1) * e), axis=-1)
+
+    @profiled
+    def Gompertz_fit(self, df, x, y, inib, inic, p0=None, jac=False):
         """
         Initial value of parameter a for Gompertz curve fitting is mean value of y.
+        If p0 is given (e.g. popt of the previous measurement of the same plant), the fitting is warm-started from p0 instead.
 
         Arguments
         --------
@@ -252,24 +395,202 @@ class dataset:
             Gompertz parameter b, affecting the y value at x=0. Lower value result in higher y value at x=0. inib=7, then y at x=0 is almost 0.
         inic: float
             Gompertz parameter c. If the y value is plateau over x=50, then inic=0.9. Lower value result in early plateau.
+        p0: array-like
+            Initial values of Gompertz parameters [a, b, c]. If None (default), [mean of y, inib, inic] is used.
+        jac: bool
+            If True, curve_fit uses the analytic Jacobian of the Gompertz curve instead of numerical derivatives.
         """
 
-        df_train = df[[x,y]].dropna(subset=[y])
+        df_train = (df.todataframe([x,y]) if isinstance(df, organtable) else df[[x,y]]).dropna(subset=[y])
         x_train = df_train[x]
         y_train = df_train[y]
         ymean = statistics.mean(y_train)
         ymax = max(y_train)
-        popt, pcov = curve_fit(f = self.Gompertz, xdata = x_train, ydata = y_train, p0 = [ymean, inib, inic], maxfev = 800)
+        if p0 is None:
+            p0 = [ymean, inib, inic]
+        from scipy.optimize import curve_fit # scipy is imported on the first fitting, not with the package
+        jac = (lambda t, a, b, c: self.Gompertz_jac(np.asarray(t, dtype=float), a, b, c)) if jac else None
+        maxfev = 800
+        try:
+            popt, pcov, infodict, mesg, ier = curve_fit(f = self.Gompertz, xdata = x_train, ydata = y_train, p0 = p0, maxfev = maxfev, full_output = True, jac = jac)
+        except RuntimeError: # Not converged within maxfev evaluations
+            if self.profiler is not None:
+                self.profiler.count('Gompertz_fit', fits=1, nfev=maxfev, converged=0)
+            raise
+        if self.profiler is not None:
+            self.profiler.count('Gompertz_fit', fits=1, nfev=infodict['nfev'], converged=int(ier in [1, 2, 3, 4]))
         return popt, pcov, ymax
     
-    def DVSI(self, dfcomp, coldoe, coldvsi, measureddate, dftemp, coldate, coltemp): 
+    @profiled
+    def Gompertz_fits(self, x, y, inib, inic, p0=None, maxfev=800, cache=True):
+        """
+        Fitting Gompertz curves of many plants (or organs) in one batched call.
+        All the curves are fitted at once by a Levenberg-Marquardt method vectorized over the curves, with the analytic Jacobian of the Gompertz curve.
+        Unlike 'def Gompertz_fit()', a curve which does not converge does not raise an error but is reported in the diagnostics.
+
+        Arguments
+        --------
+        x: list of array-like
+            Explanatory variable (e.g. DVSF) of each curve.
+        y: list of array-like
+            Objective variable of each curve. NaN values are ignored.
+        inib, inic: float
+            Same as 'def Gompertz_fit()'. Default initial values are [mean of y, inib, inic].
+        p0: array-like
+            Warm-start values of [a, b, c]. Shape (3,) is a population prior used for all the curves, and shape (number of curves, 3) gives the values of each curve (e.g. popt of the previous fits). Rows with NaN use the default initial values.
+        maxfev: integer
+            Maximum number of evaluations of the curve for each curve.
+        cache: bool
+            If True (default), fits are looked up in and stored to the process-wide 'fitcache', keyed by a hash of the training data, initial values and maxfev.
+
+        Outputs
+        --------
+        popt: numpy array
+            Parameters [a, b, c] of each curve, shape (number of curves, 3).
+        pcov: numpy array
+            Covariance of the parameters, shape (number of curves, 3, 3). inf if it cannot be estimated.
+        diagnostics: pandas DataFrame
+            One row per curve with converged (bool), nfev, cost (half of the sum of squared residuals), n (number of data), cached (bool) and message.
+        """
+
+        ncurve = len(x)
+        xs = []
+        ys = []
+        for _x, _y in zip(x, y):
+            _x = np.asarray(_x, dtype=float)
+            _y = np.asarray(_y, dtype=float)
+            xs.append(_x[~np.isnan(_y)])
+            ys.append(_y[~np.isnan(_y)])
+        P0 = np.array([[np.mean(_y) if _y.shape[0] > 0 else np.nan, inib, inic] for _y in ys])
+        if p0 is not None:
+            p0 = np.broadcast_to(np.asarray(p0, dtype=float), (ncurve, 3))
+            warm = ~np.isnan(p0).any(axis=1)
+            P0[warm] = p0[warm]
+
+        popt = np.full((ncurve, 3), np.nan)
+        pcov = np.full((ncurve, 3, 3), np.inf)
+        diagnostics = [None] * ncurve
+        keys = [None] * ncurve
+        tofit = []
+        for i in range(ncurve):
+            if cache:
+                digest = hashlib.sha1()
+                for array in [xs[i], ys[i], P0[i], np.array([maxfev], dtype=float)]:
+                    digest.update(np.ascontiguousarray(array).tobytes())
+                keys[i] = digest.hexdigest()
+                value = fitcache.get(keys[i])
+                if value is not None:
+                    popt[i], pcov[i] = value[0], value[1]
+                    diagnostics[i] = {**value[2], 'cached':True}
+                    continue
+            tofit.append(i)
+
+        if tofit:
+            # Padding the curves to a 2d array with a mask
+            nmax = max(max(xs[i].shape[0] for i in tofit), 1)
+            X = np.ones((len(tofit), nmax))
+            Y = np.zeros((len(tofit), nmax))
+            M = np.zeros((len(tofit), nmax), dtype=bool)
+            for j, i in enumerate(tofit):
+                X[j, :xs[i].shape[0]] = xs[i]
+                Y[j, :ys[i].shape[0]] = ys[i]
+                M[j, :xs[i].shape[0]] = True
+            _popt, _pcov, _diagnostics = self.Gompertz_LM(X, Y, M, P0[tofit], maxfev)
+            for j, i in enumerate(tofit):
+                popt[i], pcov[i], diagnostics[i] = _popt[j], _pcov[j], {**_diagnostics[j], 'cached':False}
+                if cache:
+                    fitcache.put(keys[i], (popt[i].copy(), pcov[i].copy(), _diagnostics[j]))
+
+        if self.profiler is not None:
+            fitted = [diagnostics[i] for i in tofit]
+            self.profiler.count('Gompertz_fits', fits=len(fitted), nfev=sum(d['nfev'] for d in fitted), converged=sum(d['converged'] for d in fitted), cachehits=ncurve-len(tofit))
+        return popt, pcov, pd.DataFrame(diagnostics, columns=['converged', 'nfev', 'cost', 'n', 'cached', 'message'])
+
+    def Gompertz_LM(self, X, Y, M, P0, maxfev, ftol=1.49012e-08, xtol=1.49012e-08):
+        """
+        Levenberg-Marquardt fitting of Gompertz curves vectorized over curves.
+        X, Y and M (mask of valid data) have shape (number of curves, maximum number of data), and P0 has shape (number of curves, 3).
+        The tolerances are those of scipy.optimize.curve_fit.
+        """
+
+        ncurve = X.shape[0]
+        n = M.sum(axis=1)
+        P = np.array(P0, dtype=float)
+        def residuals(P):
+            with np.errstate(all='ignore'):
+                R = self.Gompertz(X, P[:,0:1], P[:,1:2], P[:,2:3]) - Y
+            return np.where(M, R, 0.0)
+        def costs(R):
+            cost = 0.5 * np.sum(R**2, axis=1)
+            cost[~np.isfinite(R).all(axis=1)] = np.inf
+            return cost
+
+        R = residuals(P)
+        cost = costs(R)
+        nfev = np.ones(ncurve, dtype=int)
+        lam = np.full(ncurve, 1e-3)
+        converged = np.zeros(ncurve, dtype=bool)
+        message = np.array(['maximum number of function evaluations reached'] * ncurve, dtype=object)
+        message[~np.isfinite(cost)] = 'initial values give non-finite residuals'
+        message[n < 3] = 'fewer data than parameters'
+        active = np.isfinite(cost) & (n >= 3)
+
+        while active.any():
+            with np.errstate(all='ignore'):
+                J = np.where(M[:,:,None], self.Gompertz_jac(X, P[:,0:1], P[:,1:2], P[:,2:3]), 0.0)
+            JTJ = np.einsum('kmi,kmj->kij', J, J)
+            g = np.einsum('kmi,km->ki', J, R)
+            diag = np.einsum('kii->ki', JTJ)
+            A = JTJ + (lam[:,None] * np.maximum(diag, 1e-12))[:,:,None] * np.eye(3)
+            A[~active] = np.eye(3)
+            g[~active] = 0
+            with np.errstate(all='ignore'):
+                delta = -np.linalg.solve(A, g[:,:,None])[:,:,0]
+            delta[~np.isfinite(delta).all(axis=1)] = 0
+            Pnew = P + delta
+            Rnew = residuals(Pnew)
+            costnew = costs(Rnew)
+            nfev += active
+
+            # Convergence tests of MINPACK: actual and predicted relative reductions of the cost, and the step scaled by the norms of the columns of J
+            better = active & (costnew < cost)
+            scale = np.where(cost > 0, cost, 1)
+            actual = np.where(cost > 0, (cost - costnew) / scale, 0)
+            predicted = np.where(cost > 0, -(np.einsum('ki,ki->k', g, delta) + 0.5 * np.einsum('ki,kij,kj->k', delta, JTJ, delta)) / scale, 0)
+            D = np.sqrt(np.maximum(diag, 1e-12))
+            stepsmall = np.linalg.norm(D * delta, axis=1) <= xtol * np.linalg.norm(D * P, axis=1)
+            P[better] = Pnew[better]
+            R[better] = Rnew[better]
+            lam[better] /= 10
+            lam[active & ~better] *= 10
+            done = active & ((better & (actual <= ftol) & (np.abs(predicted) <= ftol)) | (better & stepsmall) | (cost == 0))
+            converged |= done
+            message[done] = 'converged'
+            stuck = active & ~done & (lam > 1e16)
+            message[stuck] = 'no further reduction of the cost'
+            cost = np.where(better, costnew, cost)
+            active &= ~done & ~stuck & (nfev < maxfev)
+
+        # Covariance of the parameters as in curve_fit (absolute_sigma=False)
+        with np.errstate(all='ignore'):
+            J = np.where(M[:,:,None], self.Gompertz_jac(X, P[:,0:1], P[:,1:2], P[:,2:3]), 0.0)
+        JTJ = np.einsum('kmi,kmj->kij', J, J)
+        pcov = np.full((ncurve, 3, 3), np.inf)
+        for k in range(ncurve):
+            if n[k] > 3 and np.isfinite(JTJ[k]).all() and np.linalg.matrix_rank(JTJ[k]) == 3:
+                pcov[k] = np.linalg.inv(JTJ[k]) * (2 * cost[k] / (n[k] - 3))
+        diagnostics = [{'converged':bool(converged[k]), 'nfev':int(nfev[k]), 'cost':float(cost[k]), 'n':int(n[k]), 'message':message[k]} for k in range(ncurve)]
+        return P, pcov, diagnostics
+
+    @profiled
+    def DVSI(self, dfcomp, coldoe, coldvsi, measureddate, dftemp, coldate, coltemp, cache=True, previous=None, previousdate=None):
         """
         Develepment stage of individual fruit (DVSF) or leaf (DVSL).
         Initial value of parameter 'a' for Gompertz curve fitting is mean value of y.
 
         Arguments
         --------
-        dfcomp: pandas DataFrame
+        dfcomp: pandas DataFrame or shootappearance.organtable
             self.compfruit or self.compleaf output in the predescribed 'def complement()' function
         coldoe: string
             Column name of Day of Emergence of fruit (DOEF) or leaf (DOEL)
@@ -277,34 +598,205 @@ class dataset:
             Output Column name of DVSI.
         measureddate: datetime.date
             measureddate output in the predescribed 'def complement()' function 
-        dftemp: pandas DataFrame
+        dftemp: pandas DataFrame or shootappearance.dailytemp
             Data including date (type: string) and daily average temperature [C] (type: numpy integer or float).
+            A dailytemp (e.g. made by dailytemp.readcsv()) is used as it is, so the dates are not parsed again in every call.
         coldate: string
             Column name of date.
         coltemp: string
             Column name of objective variable.
+        cache: bool
+            If True (default), DVSI trajectories shared by organs, calls and dataset instances are reused from 'dvsicache'.
+        previous: pandas DataFrame
+            Output of this function for the same plant measured on an earlier date (previousdate).
+            The DVSI of an organ found in previous with the same truss id, leaf or fruit id and emergence date is integrated only from previousdate to measureddate. The other organs are integrated from their emergence dates.
+            Use 'def carryover()' before this function to keep the emergence dates of the organs which already existed.
+        previousdate: datetime.date
+            measureddate of previous.
         """
-        
-        self.compdvsi = copy.deepcopy(dfcomp)
-        self.temp = copy.deepcopy(dftemp)
-        self.temp = self.temp.rename(columns={coldate:'date', coltemp:'temp'})
-        self.temp['date'] = self.temp['date'].apply(lambda x: parser.parse(x).date()) 
-        
-        arrayDVSI = []
-        for index, row in self.compdvsi.iterrows():
-            iter_date = row[coldoe]
-            end_date = measureddate
-            delta = datetime.timedelta(days=1)
-            _DVSI = 0
-            while iter_date < end_date:
-                temp_today = self.temp[self.temp['date']==iter_date]['temp']
-                _DVRI = self.DVRI(temp_today, _DVSI)
-                _DVSI += _DVRI
-                iter_date += delta
-            arrayDVSI = np.concatenate([arrayDVSI, [_DVSI]])
-        self.compdvsi[coldvsi] = arrayDVSI
+
+        if isinstance(dftemp, dailytemp):
+            self.temp = dftemp
+        else:
+            self.temp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+
+        start = None if previous is None else self.previousDVSI(dfcomp, coldoe, coldvsi, previous)
+        DVSI = self.DVSI_array(doe=dfcomp[coldoe], measureddate=measureddate, date=self.temp.day, temp=self.temp.temp, cache=cache, start=start, startdate=previousdate, fingerprint=self.temp.fingerprint)
+        self.compdvsi = self.withcolumns(dfcomp, **{coldvsi: DVSI})
         return self.compdvsi
 
+    def withcolumns(self, df, **columns):
+        """
+        Organ table (dataframe or shootappearance.organtable) with columns added or replaced.
+        Unless self.inplace is True, the table is a new one and df is not changed. A new organtable shares the unchanged columns of df, which are read-only.
+        A dataframe is copied, because a shallow copy shares its data with df and writing to one changes the other unless pandas copy-on-write is enabled.
+        """
+
+        if not self.inplace:
+            df = df.copy(deep=not (isinstance(df, organtable) or pd.options.mode.copy_on_write is True))
+        for name, value in columns.items():
+            df[name] = value
+        return df
+
+    def carryover(self, dfcomp, coldoe, colage, measureddate, previous, previousdate):
+        """
+        Carrying over the emergence date and age of the organs which already existed in an earlier result of the same plant, so that only newly emerged or complemented organs get the dates estimated in 'def complement()'.
+        Organs are matched by truss id and leaf or fruit id.
+
+        Arguments
+        --------
+        dfcomp: pandas DataFrame
+            self.compfruit or self.compleaf output in the predescribed 'def complement()' function
+        coldoe: string
+            Column name of Day of Emergence of fruit (DOEF) or leaf (DOEL)
+        colage: string
+            Column name of age of fruit (FAGE) or leaf (LVAGE)
+        measureddate: datetime.date
+            measureddate output in the predescribed 'def complement()' function
+        previous: pandas DataFrame
+            Earlier output of 'def complement()' or 'def DVSI()' of the same plant.
+        previousdate: datetime.date
+            measureddate of previous.
+        """
+
+        keys = [col for col in ['id_truss', 'id_leaf', 'id_fruit'] if col in dfcomp.columns and col in previous.columns]
+        dfkeys = dfcomp.todataframe(keys) if isinstance(dfcomp, organtable) else dfcomp[keys]
+        dfprevious = previous.todataframe(keys + [coldoe, colage]) if isinstance(previous, organtable) else previous[keys + [coldoe, colage]]
+        dfcarried = pd.merge(dfkeys, dfprevious.drop_duplicates(subset=keys), how='left')
+        existed = dfcarried[coldoe].notna().to_numpy()
+        doe = np.array(dfcomp[coldoe])
+        age = np.array(dfcomp[colage], dtype=float)
+        doe[existed] = dfcarried.loc[existed, coldoe].to_numpy().astype(doe.dtype)
+        age[existed] = dfcarried.loc[existed, colage].to_numpy(dtype=float) + (measureddate - previousdate).days
+        return self.withcolumns(dfcomp, **{coldoe: doe, colage: age})
+
+    def previousDVSI(self, dfcomp, coldoe, coldvsi, previous):
+        """
+        DVSI in previous (an earlier output of 'def DVSI()') of each organ of dfcomp, matched by truss id, leaf or fruit id and emergence date. NaN for new organs.
+        """
+
+        keys = [col for col in ['id_truss', 'id_leaf', 'id_fruit', coldoe] if col in dfcomp.columns and col in previous.columns]
+        dfkeys = dfcomp.todataframe(keys, dates='object') if isinstance(dfcomp, organtable) else dfcomp[keys]
+        dfprevious = previous.todataframe(keys + [coldvsi], dates='object') if isinstance(previous, organtable) else previous[keys + [coldvsi]]
+        start = pd.merge(dfkeys, dfprevious.drop_duplicates(subset=keys), how='left')[coldvsi]
+        return start.to_numpy(dtype=float)
+
+    @profiled
+    def DVSI_array(self, doe, measureddate, date, temp, cache=True, start=None, startdate=None, fingerprint=None):
+        """
+        Integrating DVSI of all the organs simultaneously.
+        The temperature series is indexed by date once, and the DVSI of every organ that has already emerged is advanced by one DVRI step per calendar day from the earliest emergence date to the measured date.
+        The result is identical (up to floating-point rounding) to integrating each organ separately from its own emergence date.
+
+        Arguments
+        --------
+        doe: array-like of datetime.date
+            Day of emergence of each organ (e.g. DOEF or DOEL column).
+        measureddate: datetime.date
+            measureddate output in the predescribed 'def complement()' function
+        date: array-like of datetime.date (or numpy datetime64[D], or integer numbers of days since 1970-01-01)
+            Dates of the daily temperature series.
+        temp: array-like of float
+            Daily average temperature [C].
+        cache: bool
+            If True (default), DVSI trajectories are looked up in and stored to the process-wide 'dvsicache', keyed by (emergence date, measured date, fingerprint of the temperature series).
+        start: array-like of float
+            Known DVSI of each organ at startdate, e.g. the result of an earlier measurement. The DVSI of an organ with a start value is integrated only from startdate (or from its emergence date if it emerged after startdate). NaN means that the organ is integrated from its emergence date.
+        startdate: datetime.date
+            The date of start.
+        fingerprint: string
+            Fingerprint of the temperature series used as a part of the cache keys, e.g. dailytemp.fingerprint. If None, it is computed from date and temp.
+
+        Outputs
+        --------
+        DVSI: numpy array of float
+            DVSI of each organ at the measured date, in the same order as doe.
+        """
+
+        doeday = np.asarray(doe).astype('datetime64[D]').astype(np.int64)
+        endday = int(np.datetime64(measureddate, 'D').astype(np.int64))
+        DVSI = np.zeros(doeday.shape[0])
+        if start is None:
+            continued = np.zeros(doeday.shape[0], dtype=bool)
+        else:
+            start = np.asarray(start, dtype=float)
+            continued = ~np.isnan(start)
+        if doeday.shape[0] == 0 or (doeday[~continued].min(initial=endday) >= endday and not continued.any()):
+            return DVSI
+
+        # Indexing the temperature series by day number
+        tempday = np.asarray(date).astype('datetime64[D]').astype(np.int64)
+        tempvalue = np.asarray(temp, dtype=float)
+        if np.unique(tempday).shape[0] != tempday.shape[0]:
+            raise ValueError('Temperature data contain duplicated dates.')
+
+        # Organs whose DVSI at startdate is known
+        if continued.any():
+            startday = int(np.datetime64(startdate, 'D').astype(np.int64))
+            # Organs emerging after startdate (DVSI=0 at startdate) start at their emergence dates
+            DVSI[continued] = self.DVSI_integrate(np.maximum(doeday[continued], startday), start[continued], endday, tempday, tempvalue)
+
+        # Organs sharing an emergence date share a DVSI trajectory, so only unique emergence dates missing in the cache are integrated.
+        uniquedoeday, inverse = np.unique(doeday[~continued], return_inverse=True)
+        uniqueDVSI = np.zeros(uniquedoeday.shape[0])
+        if cache:
+            if fingerprint is None:
+                fingerprint = dvsicache.fingerprint(tempday, tempvalue)
+            keys = [(int(d), endday, fingerprint) for d in uniquedoeday]
+            missing = np.zeros(uniquedoeday.shape[0], dtype=bool)
+            for i, key in enumerate(keys):
+                if uniquedoeday[i] >= endday: # Organs emerging on or after the measured date have DVSI=0
+                    continue
+                value = dvsicache.get(key)
+                if value is None:
+                    missing[i] = True
+                else:
+                    uniqueDVSI[i] = value
+            if self.profiler is not None:
+                self.profiler.count('DVSI', cachehits=int((~missing & (uniquedoeday < endday)).sum()), cachemisses=int(missing.sum()))
+        else:
+            missing = np.ones(uniquedoeday.shape[0], dtype=bool)
+        missing &= uniquedoeday < endday
+
+        if missing.any():
+            _DVSI = self.DVSI_integrate(uniquedoeday[missing], np.zeros(missing.sum()), endday, tempday, tempvalue)
+            uniqueDVSI[missing] = _DVSI
+            if cache:
+                for i, value in zip(np.flatnonzero(missing), _DVSI):
+                    dvsicache.put(keys[i], float(value))
+
+        DVSI[~continued] = uniqueDVSI[inverse.reshape(-1)]
+        return DVSI
+
+    def DVSI_integrate(self, startday, DVSIstart, endday, tempday, tempvalue):
+        """
+        Advancing the DVSI of organs day by day from startday (DVSI=DVSIstart) to endday.
+        Days are numbers of days since 1970-01-01. An organ is not advanced before its startday.
+        """
+
+        DVSI = np.array(DVSIstart, dtype=float)
+        firstday = startday.min()
+        if firstday >= endday:
+            return DVSI
+        dailytemp = np.full(endday - firstday, np.nan)
+        inrange = (tempday >= firstday) & (tempday < endday)
+        dailytemp[tempday[inrange] - firstday] = tempvalue[inrange]
+        if np.isnan(dailytemp).any():
+            missingday = firstday + int(np.flatnonzero(np.isnan(dailytemp))[0])
+            raise ValueError('Temperature data do not contain the date ' + str(np.datetime64(int(missingday), 'D')) + '.')
+
+        if self.profiler is not None:
+            self.profiler.count('DVSI', days=dailytemp.shape[0], organdays=int(np.sum(endday - np.maximum(startday, firstday))))
+        # Overflow raises as in the scalar integration, instead of giving inf and NaN
+        try:
+            with np.errstate(over='raise', invalid='raise'):
+                for i in range(dailytemp.shape[0]):
+                    started = startday <= firstday + i
+                    DVSI[started] += self.DVRI(dailytemp[i], DVSI[started])
+        except FloatingPointError as e:
+            raise OverflowError('DVSI diverged in the integration (' + str(e) + ').') from e
+        return DVSI
+
     def DVRI(self, temp, DVSI):
         """
         DVRF (rate of developing stage of fruit) depends on daily mean temperature as the following equation (De Koning, 1994).
@@ -360,18 +852,37 @@ class dataset:
     #     DVRF = 0.0181 + math.log(temp/20) * (0.0392 - 0.213 * DVSF + 0.415 * DVSF**2 - 0.24 * DVSF**3)
     #     return(DVRF)
     
-    def interpolate_and_Gompertz_est(self, df, colx, coly, Gompparams): 
-        dfest = copy.deepcopy(df)
-        interpolatedvalue = dfest[coly].interpolate()
-        for index, row in df.iterrows():
-            if np.isnan(row[coly]):
-                estimatedvalue = self.Gompertz(row[colx], *Gompparams)
-                if row['method'] == 'interpolated': 
-                    dfest.loc[index, coly] = interpolatedvalue.loc[index]
-                elif row['method'] == 'complemented': 
-                    dfest.loc[index, coly] = estimatedvalue
-        return dfest        
+    @profiled
+    def interpolate_and_Gompertz_est(self, df, colx, coly, Gompparams, asarray=False):
+        """
+        Filling the missing sizes. Missing sizes of 'interpolated' organs are linearly interpolated, and those of 'complemented' organs are estimated with the Gompertz curve.
 
+        Arguments
+        --------
+        df: pandas DataFrame or shootappearance.organtable
+            Output of 'def DVSI()'.
+        colx: string
+            Column name of explanatory variable (DVSF or DVSL).
+        coly: string
+            Column name of size.
+        Gompparams: array-like
+            popt output in 'def Gompertz_fit()'.
+        asarray: bool
+            If True, only the filled coly column is returned as a numpy array, without making a new dataframe.
+        """
+
+        value = np.array(df[coly], dtype=float)
+        missing = np.isnan(value)
+        method = df['method']
+        interpolated = missing & np.asarray(method == 'interpolated')
+        complemented = missing & np.asarray(method == 'complemented')
+        value[interpolated] = pd.Series(value).interpolate().to_numpy()[interpolated]
+        value[complemented] = self.Gompertz(np.asarray(df[colx], dtype=float)[complemented], *Gompparams)
+        if asarray:
+            return value
+        return self.withcolumns(df, **{coly: value})
+
+    @profiled
     def initial_fruit(self, df, coldiameter, DMC):
         """
         Make initial values for TOMULATION.
@@ -381,7 +892,7 @@ class dataset:
 
         Arguments
         --------
-        df: pandas DataFrame
+        df: pandas DataFrame or shootappearance.organtable
             Data with fruit diameter.
         coldiameter: string
             Column name of fruit diameter.
@@ -389,20 +900,18 @@ class dataset:
             Fruit dry matter content.
         """
         
-        dfinit = copy.deepcopy(df)
-        r = dfinit[coldiameter]/2
-        dfinit['FF'] = 4/3 * math.pi * r **3
-        dfinit['DMC'] = DMC
-        dfinit['FD'] = dfinit['FF'] * dfinit['DMC']
-        return dfinit
+        r = np.asarray(df[coldiameter], dtype=float)/2
+        FF = 4/3 * math.pi * r **3
+        return self.withcolumns(df, FF=FF, DMC=DMC, FD=FF * DMC)
 
+    @profiled
     def initial_leaf(self, df, colarea, SLA=0.05):
         """
         Make initial values for TOMULATION.
 
         Arguments
         --------
-        df: pandas DataFrame
+        df: pandas DataFrame or shootappearance.organtable
             Data with leaf area.
         colarea: string
             Column name of leaf area.
@@ -410,12 +919,166 @@ class dataset:
             Specific leaf area [m2/gDM].
         """
         
-        dfinit = copy.deepcopy(df)
-        dfinit = dfinit.rename(columns={colarea:'LA'})
+        # Renaming makes the new table (unless self.inplace), so the columns are added to it directly
+        if isinstance(df, organtable):
+            dfinit = df.rename({colarea:'LA'}, inplace=self.inplace)
+        else:
+            dfinit = df if self.inplace else df.copy(deep=pd.options.mode.copy_on_write is not True)
+            dfinit.rename(columns={colarea:'LA'}, inplace=True)
+        LA = np.asarray(dfinit['LA'], dtype=float)
         dfinit['SLA'] = SLA
-        dfinit['LV'] = dfinit['LA'] / dfinit['SLA']
+        dfinit['LV'] = LA / SLA
         return dfinit
 
+    def Gompertz_draws(self, popt, pcov, n, seed=None, maxrounds=100):
+        """
+        Drawing n sets of Gompertz parameters from the multivariate normal distribution of the fit, N(popt, pcov).
+        Sets outside the domain of the growth curve (a > 0, b > 0, 0 < c < 1) are drawn again, so the distribution is truncated to the domain.
+        If pcov is not finite (e.g. too few data), all the sets are popt.
+
+        Arguments
+        --------
+        popt, pcov: array-like
+            Outputs of 'def Gompertz_fit()'.
+        n: integer
+            Number of sets (ensemble members).
+        seed: integer or numpy.random.Generator
+            Seed of the random numbers.
+        maxrounds: integer
+            Maximum number of rounds of drawing again.
+
+        Outputs
+        --------
+        params: numpy array
+            Parameters [a, b, c] of each member, shape (n, 3).
+        """
+
+        popt = np.asarray(popt, dtype=float)
+        pcov = np.asarray(pcov, dtype=float)
+        params = np.tile(popt, (n, 1))
+        if not np.isfinite(pcov).all():
+            return params
+        rng = np.random.default_rng(seed)
+        invalid = np.ones(n, dtype=bool)
+        for i in range(maxrounds):
+            params[invalid] = rng.multivariate_normal(popt, pcov, size=invalid.sum(), method='eigh')
+            invalid = (params[:,0] <= 0) | (params[:,1] <= 0) | (params[:,2] <= 0) | (params[:,2] >= 1)
+            if not invalid.any():
+                return params
+        raise ValueError('%d of %d parameter sets are outside the domain after %d rounds of drawing' % (invalid.sum(), n, maxrounds))
+
+    def ensemble_est(self, df, colx, coly, params):
+        """
+        Sizes of the organs in every ensemble member. Same as 'def interpolate_and_Gompertz_est()', but the sizes of 'complemented' organs are estimated with the Gompertz parameters of each member at once.
+
+        Arguments
+        --------
+        df: pandas DataFrame or shootappearance.organtable
+            Output of 'def DVSI()'.
+        colx, coly: string
+            Same as 'def interpolate_and_Gompertz_est()'.
+        params: numpy array
+            Gompertz parameters of the members, shape (number of members, 3).
+
+        Outputs
+        --------
+        values: numpy array
+            Sizes, shape (number of members, number of rows of df). Measured and interpolated sizes are the same in all the members.
+        """
+
+        params = np.asarray(params, dtype=float)
+        value = np.asarray(df[coly], dtype=float)
+        complemented = np.isnan(value) & (np.asarray(df['method']) == 'complemented')
+        values = np.repeat(self.interpolate_and_Gompertz_est(df, colx, coly, params[0], asarray=True)[None, :], params.shape[0], axis=0)
+        x = np.asarray(df[colx], dtype=float)[complemented]
+        values[:, complemented] = self.Gompertz(x[None, :], params[:, 0:1], params[:, 1:2], params[:, 2:3])
+        return values
+
+    def twoddarray(self, df, coltruss, colindiv, values, idtrussmax=60):
+        """
+        2d tables of stacked values, e.g. ensemble members. The leading axes of values are kept, and the last axis (rows of df) is scattered into the table layout of 'def twoddfs()'.
+
+        Outputs
+        --------
+        array: numpy array
+            Shape values.shape[:-1] + (idtrussmax, maximum id of leaf or fruit). Empty cells are NaN.
+        """
+
+        values = np.asarray(values, dtype=float)
+        itruss = np.asarray(df[coltruss]).astype(int) - 1
+        iindiv = np.asarray(df[colindiv]).astype(int) - 1
+        nmax = int(np.max(df[colindiv]))
+        intable = (itruss >= 0) & (itruss < idtrussmax)
+        array = np.full(values.shape[:-1] + (idtrussmax, nmax), np.nan)
+        array[..., itruss[intable], iindiv[intable]] = values[..., intable]
+        return array
+
+    @profiled
+    def ensemble_fruit(self, df, colx, coly, popt, pcov, n, DMC, idtrussmax=60, seed=None):
+        """
+        Ensemble of initial values of fruits for TOMULATION reflecting the uncertainty of the Gompertz fitting.
+        n parameter sets are drawn from (popt, pcov) by 'def Gompertz_draws()', the fruit diameters of all the members are estimated as a (member, fruit) array, and FF and FD are computed as in 'def initial_fruit()' and laid out as the 2d tables of 'def twoddf()' stacked over the members.
+
+        Arguments
+        --------
+        df: pandas DataFrame
+            Output of 'def DVSI()' of fruits.
+        colx, coly: string
+            Column names of DVSF and fruit diameter.
+        popt, pcov: array-like
+            Outputs of 'def Gompertz_fit()'.
+        n: integer
+            Number of members.
+        DMC: float
+            Fruit dry matter content.
+        idtrussmax: integer
+            Number of trusses = Number of rows of 2d table.
+        seed: integer or numpy.random.Generator
+            Seed of the random numbers.
+
+        Outputs
+        --------
+        ensemble: dict
+            'params': Gompertz parameters of the members, shape (n, 3).
+            'FF', 'FD': shape (n, idtrussmax, maximum id of fruit). ensemble['FF'][k] is FFI of member k without the id_truss column.
+        """
+
+        params = self.Gompertz_draws(popt, pcov, n, seed=seed)
+        r = self.ensemble_est(df, colx, coly, params) / 2
+        FF = 4/3 * math.pi * r **3
+        FD = FF * DMC
+        stack = self.twoddarray(df, 'id_truss', 'id_fruit', np.stack([FF, FD]), idtrussmax=idtrussmax)
+        return {'params':params, 'FF':stack[0], 'FD':stack[1]}
+
+    @profiled
+    def ensemble_leaf(self, df, colx, coly, popt, pcov, n, SLA=0.05, idtrussmax=60, seed=None):
+        """
+        Ensemble of initial values of leaves for TOMULATION reflecting the uncertainty of the Gompertz fitting. Same as 'def ensemble_fruit()', with LA and LV computed as in 'def initial_leaf()'.
+
+        Arguments
+        --------
+        df: pandas DataFrame
+            Output of 'def DVSI()' of leaves.
+        colx, coly: string
+            Column names of DVSL and leaf area.
+        popt, pcov, n, idtrussmax, seed:
+            Same as 'def ensemble_fruit()'.
+        SLA: float
+            Specific leaf area [m2/gDM].
+
+        Outputs
+        --------
+        ensemble: dict
+            'params': Gompertz parameters of the members, shape (n, 3).
+            'LA', 'LV': shape (n, idtrussmax, maximum id of leaf).
+        """
+
+        params = self.Gompertz_draws(popt, pcov, n, seed=seed)
+        LA = self.ensemble_est(df, colx, coly, params)
+        LV = LA / SLA
+        stack = self.twoddarray(df, 'id_truss', 'id_leaf', np.stack([LA, LV]), idtrussmax=idtrussmax)
+        return {'params':params, 'LA':stack[0], 'LV':stack[1]}
+
 
 # class initial_values_for_tomulation(dataset):
 #     def __init__(self, nleaf, leaf, nfruit, fruit, DMC, ):
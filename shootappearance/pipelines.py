@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# Lazy, cached initialization pipeline of shootappearance.dataset (MIT license).
+import hashlib
+import collections
+import numpy as np
+import pandas as pd
+from .main import dataset
+from .climate import dailytemp
+from .organs import organtable
+
+def fingerprint(value):
+    """
+    Hash of a parameter value of the pipeline (dataframes, arrays, dailytemp or plain values).
+    """
+
+    digest = hashlib.sha1()
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dailytemp):
+        digest.update(value.fingerprint.encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+def _copy(value):
+    """
+    Copy of an output, so that changing it does not change the cached results of the stages.
+    An organtable is copied shallowly, because its columns are read-only.
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, organtable)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {key: _copy(v) for key, v in value.items()}
+    return value
+
+# Stages: name -> (upstream stages, parameters). The function of a stage is the method 'stage_<name>' of pipeline.
+STAGES = {
+    'complement': ([], ['dfleafnum', 'dffruitnum', 'dfleafsize', 'dffruitsize', 'datasetargs', 'date', 'maxfruitsonbranch', 'nfruit']),
+    'climate': ([], ['dftemp', 'coldate', 'coltemp']),
+    'fruitdvsi': (['complement', 'climate'], []),
+    'leafdvsi': (['complement', 'climate'], []),
+    'fruitfit': (['complement', 'fruitdvsi'], ['inibfruit', 'inicfruit']),
+    'leaffit': (['complement', 'leafdvsi'], ['inibleaf', 'inicleaf']),
+    'fruitest': (['complement', 'fruitdvsi', 'fruitfit'], []),
+    'leafest': (['complement', 'leafdvsi', 'leaffit'], []),
+    'fruitinit': (['complement', 'fruitest'], ['DMC']),
+    'leafinit': (['complement', 'leafest'], ['SLA']),
+    'fruittables': (['complement', 'fruitinit'], ['idtrussmax']),
+    'leaftables': (['complement', 'leafinit'], ['idtrussmax']),
+    'fruitensemble': (['complement', 'fruitdvsi', 'fruitfit'], ['DMC', 'idtrussmax', 'nensemble', 'seed']),
+    'leafensemble': (['complement', 'leafdvsi', 'leaffit'], ['SLA', 'idtrussmax', 'nensemble', 'seed']),
+}
+
+# Outputs: name -> (stage, function to take the output from the result of the stage)
+OUTPUTS = {
+    'nleafonplant': ('complement', lambda x: x[1][0]),
+    'nfruitave': ('complement', lambda x: x[1][1]),
+    'nbranchontruss': ('complement', lambda x: x[1][2]),
+    'DVS': ('complement', lambda x: x[1][5]),
+    'measureddate': ('complement', lambda x: x[1][6]),
+    'dffruit': ('fruitinit', lambda x: x),
+    'dfleaf': ('leafinit', lambda x: x),
+    'poptfruit': ('fruitfit', lambda x: x[0]),
+    'pcovfruit': ('fruitfit', lambda x: x[1]),
+    'poptleaf': ('leaffit', lambda x: x[0]),
+    'pcovleaf': ('leaffit', lambda x: x[1]),
+    'FFI': ('fruittables', lambda x: x['FF']),
+    'FDI': ('fruittables', lambda x: x['FD']),
+    'DOEFI': ('fruittables', lambda x: x['DOEF']),
+    'DVSFI': ('fruittables', lambda x: x['DVSF']),
+    'LAI': ('leaftables', lambda x: x['LA']),
+    'LVI': ('leaftables', lambda x: x['LV']),
+    'DOELI': ('leaftables', lambda x: x['DOEL']),
+    'LVAGEI': ('leaftables', lambda x: x['LVAGE']),
+    'FFE': ('fruitensemble', lambda x: x['FF']),
+    'FDE': ('fruitensemble', lambda x: x['FD']),
+    'poptfruitE': ('fruitensemble', lambda x: x['params']),
+    'LAE': ('leafensemble', lambda x: x['LA']),
+    'LVE': ('leafensemble', lambda x: x['LV']),
+    'poptleafE': ('leafensemble', lambda x: x['params']),
+}
+
+class pipeline:
+    def __init__(self, dfleafnum, dffruitnum, dfleafsize, dffruitsize, date, dftemp, coldate='Date', coltemp='Temp', maxfruitsonbranch=10, nfruit=np.nan, DMC=0.08, SLA=0.05, inibfruit=7, inicfruit=0.1, inibleaf=7, inicleaf=0.1, idtrussmax=60, nensemble=100, seed=0, maxentries=8, **datasetargs):
+        """
+        Initial values for TOMULATION as a lazy pipeline of the stages complement -> DVSI -> Gompertz_fit -> interpolate_and_Gompertz_est -> initial_fruit/initial_leaf -> twoddf.
+        A stage is computed only when an output depending on it is requested (e.g. pipeline['FFI']), and its result is cached with a key made of its parameters and the keys of its upstream stages.
+        Outputs are copies of the cached results, so changing them does not change the cache.
+        After a parameter is changed by 'def set()', only the stages depending on the parameter are computed again.
+
+        Arguments
+        ----------
+        dfleafnum, dffruitnum, dfleafsize, dffruitsize: pandas DataFrame
+            Same as shootappearance.dataset.
+        date: string
+            The date when the plant appearance measured. Format should be '%Y-%m-%d', e.g. '2024-01-01'
+        dftemp: pandas DataFrame or shootappearance.dailytemp
+            Data including date and daily average temperature [C].
+        coldate, coltemp: string
+            Column names of date and temperature of dftemp.
+        maxfruitsonbranch, nfruit:
+            Same as shootappearance.dataset.complement.
+        DMC: float
+            Fruit dry matter content.
+        SLA: float
+            Specific leaf area [m2/gDM].
+        inibfruit, inicfruit, inibleaf, inicleaf: float
+            Initial values of Gompertz parameters b and c for fruits and leaves.
+        idtrussmax: integer
+            Number of rows of the 2d tables.
+        nensemble, seed: integer
+            Number of members and seed of the random numbers of the ensembles of initial values (outputs FFE, FDE, LAE and LVE, see shootappearance.dataset.ensemble_fruit).
+        maxentries: integer
+            Number of cached results kept per stage, so that switching back to earlier parameters does not compute again.
+        datasetargs:
+            Other arguments of shootappearance.dataset (column names, units, ncompleaf and ncompfruit).
+        """
+
+        self.params = {}
+        self.paramkeys = {}
+        self.cache = {stage: collections.OrderedDict() for stage in STAGES}
+        self.maxentries = maxentries
+        self.computed = [] # Names of the stages computed so far, in order
+        self.set(dfleafnum=dfleafnum, dffruitnum=dffruitnum, dfleafsize=dfleafsize, dffruitsize=dffruitsize, datasetargs=datasetargs, date=date, maxfruitsonbranch=maxfruitsonbranch, nfruit=nfruit,
+                 dftemp=dftemp, coldate=coldate, coltemp=coltemp, DMC=DMC, SLA=SLA, inibfruit=inibfruit, inicfruit=inicfruit, inibleaf=inibleaf, inicleaf=inicleaf, idtrussmax=idtrussmax, nensemble=nensemble, seed=seed)
+
+    def set(self, **params):
+        """
+        Changing parameters, e.g. pipeline.set(DMC=0.07). Nothing is computed until an output is requested.
+        Parameters which are not used by any stage (e.g. ncompleaf or column names) are arguments of shootappearance.dataset.
+        """
+
+        stageparams = set(param for upstreams, stageparams in STAGES.values() for param in stageparams)
+        for name, value in params.items():
+            if name not in stageparams:
+                name, value = 'datasetargs', {**self.params['datasetargs'], name: value}
+            self.params[name] = value
+            self.paramkeys[name] = fingerprint(value)
+
+    def key(self, stage, keys=None):
+        """
+        Cache key of a stage under the current parameters.
+        """
+
+        keys = {} if keys is None else keys
+        if stage not in keys:
+            upstreams, params = STAGES[stage]
+            digest = hashlib.sha1(stage.encode())
+            for upstream in upstreams:
+                digest.update(self.key(upstream, keys).encode())
+            for param in params:
+                digest.update(self.paramkeys[param].encode())
+            keys[stage] = digest.hexdigest()
+        return keys[stage]
+
+    def stage(self, stage, keys=None):
+        """
+        Result of a stage, computed only if it is not cached for the current parameters.
+        """
+
+        keys = {} if keys is None else keys
+        key = self.key(stage, keys)
+        cache = self.cache[stage]
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        upstreams = [self.stage(upstream, keys) for upstream in STAGES[stage][0]]
+        result = getattr(self, 'stage_' + stage)(*upstreams)
+        self.computed.append(stage)
+        cache[key] = result
+        while len(cache) > self.maxentries:
+            cache.popitem(last=False)
+        return result
+
+    def __getitem__(self, name):
+        stage, take = OUTPUTS[name]
+        return _copy(take(self.stage(stage)))
+
+    def get(self, *names):
+        """
+        Outputs by name (see OUTPUTS), e.g. pipeline.get('FFI', 'LAI'). One name returns the value, and more names return a dict.
+        """
+
+        keys = {}
+        values = {name: _copy(OUTPUTS[name][1](self.stage(OUTPUTS[name][0], keys))) for name in names}
+        return values[names[0]] if len(names) == 1 else values
+
+    # Stage functions
+    def stage_complement(self):
+        p = self.params
+        shootdata = dataset(p['dfleafnum'], p['dffruitnum'], p['dfleafsize'], p['dffruitsize'], **p['datasetargs'])
+        return shootdata, shootdata.complement(p['date'], maxfruitsonbranch=p['maxfruitsonbranch'], nfruit=p['nfruit'])
+
+    def stage_climate(self):
+        p = self.params
+        if isinstance(p['dftemp'], dailytemp):
+            return p['dftemp']
+        return dailytemp.fromdataframe(p['dftemp'], p['coldate'], p['coltemp'])
+
+    def stage_fruitdvsi(self, complement, climate):
+        shootdata, (nleafonplant, nfruitave, nbranchontruss, dfleaf, dffruit, DVS, measureddate) = complement
+        return shootdata.DVSI(dfcomp=dffruit, coldoe='DOEF', coldvsi='DVSF', measureddate=measureddate, dftemp=climate, coldate=None, coltemp=None)
+
+    def stage_leafdvsi(self, complement, climate):
+        shootdata, (nleafonplant, nfruitave, nbranchontruss, dfleaf, dffruit, DVS, measureddate) = complement
+        return shootdata.DVSI(dfcomp=dfleaf, coldoe='DOEL', coldvsi='DVSL', measureddate=measureddate, dftemp=climate, coldate=None, coltemp=None)
+
+    def stage_fruitfit(self, complement, fruitdvsi):
+        return complement[0].Gompertz_fit(df=fruitdvsi, x='DVSF', y='value', inib=self.params['inibfruit'], inic=self.params['inicfruit'])
+
+    def stage_leaffit(self, complement, leafdvsi):
+        return complement[0].Gompertz_fit(df=leafdvsi, x='DVSL', y='value', inib=self.params['inibleaf'], inic=self.params['inicleaf'])
+
+    def stage_fruitest(self, complement, fruitdvsi, fruitfit):
+        return complement[0].interpolate_and_Gompertz_est(df=fruitdvsi, colx='DVSF', coly='value', Gompparams=fruitfit[0])
+
+    def stage_leafest(self, complement, leafdvsi, leaffit):
+        return complement[0].interpolate_and_Gompertz_est(df=leafdvsi, colx='DVSL', coly='value', Gompparams=leaffit[0])
+
+    def stage_fruitinit(self, complement, fruitest):
+        return complement[0].initial_fruit(df=fruitest, coldiameter='value', DMC=self.params['DMC'])
+
+    def stage_leafinit(self, complement, leafest):
+        return complement[0].initial_leaf(df=leafest, colarea='value', SLA=self.params['SLA'])
+
+    def stage_fruittables(self, complement, fruitinit):
+        return complement[0].twoddfs(df=fruitinit, coltruss='id_truss', colindiv='id_fruit', colvalues=['FF', 'FD', 'DOEF', 'DVSF'], idtrussmax=self.params['idtrussmax'], output='dataframe')
+
+    def stage_leaftables(self, complement, leafinit):
+        return complement[0].twoddfs(df=leafinit, coltruss='id_truss', colindiv='id_leaf', colvalues=['LA', 'LV', 'DOEL', 'LVAGE'], idtrussmax=self.params['idtrussmax'], output='dataframe')
+
+    def stage_fruitensemble(self, complement, fruitdvsi, fruitfit):
+        p = self.params
+        return complement[0].ensemble_fruit(df=fruitdvsi, colx='DVSF', coly='value', popt=fruitfit[0], pcov=fruitfit[1], n=p['nensemble'], DMC=p['DMC'], idtrussmax=p['idtrussmax'], seed=p['seed'])
+
+    def stage_leafensemble(self, complement, leafdvsi, leaffit):
+        p = self.params
+        return complement[0].ensemble_leaf(df=leafdvsi, colx='DVSL', coly='value', popt=leaffit[0], pcov=leaffit[1], n=p['nensemble'], SLA=p['SLA'], idtrussmax=p['idtrussmax'], seed=p['seed'])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Per-stage metrics of shootappearance.dataset (MIT license).
+import time
+import functools
+import tracemalloc
+import numpy as np
+import pandas as pd
+from .organs import organtable
+
+def profiled(func):
+    """
+    Decorator of dataset stages. If the dataset has no profiler (default), the stage is called as it is, so the cost is one attribute lookup.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return func(self, *args, **kwargs)
+        return self.profiler.call(func.__name__, func, self, args, kwargs)
+    return wrapper
+
+class profiler:
+    def __init__(self, memory=False, callbacks=None):
+        """
+        Recording metrics of the stages of a dataset, e.g. shootdata.profiler = shootappearance.profiler().
+        For each stage, wall time, number of calls, number of failed calls (calls which raised an error), number of rows processed and stage-specific counters (e.g. days integrated in DVSI, function evaluations of curve_fit in Gompertz_fit) are recorded.
+        Times of a stage include the stages called inside it (e.g. twoddf calls twoddfs).
+
+        Arguments
+        ----------
+        memory: bool
+            If True, peak memory of each outermost stage call is measured with tracemalloc. This slows the stages down.
+        callbacks: list of function
+            Functions called with a dict of the metrics of every stage call ('stage', 'seconds', 'rows', 'peak_bytes', 'failed' and counters).
+        """
+
+        self.memory = memory
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.stats = {}
+        self.running = [] # (stage, counters) of the stage calls running now (innermost last)
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def reset(self):
+        self.stats = {}
+
+    def call(self, stage, func, obj, args, kwargs):
+        outermost = len(self.running) == 0
+        measurememory = self.memory and outermost
+        if measurememory:
+            startedtracing = not tracemalloc.is_tracing()
+            if startedtracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.running.append((stage, {}))
+        start = time.perf_counter()
+        failed = True
+        result = None
+        try:
+            result = func(obj, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            # A call which raised is recorded too, with failed=1
+            seconds = time.perf_counter() - start
+            counters = self.running.pop()[1]
+            if measurememory:
+                peak = tracemalloc.get_traced_memory()[1]
+                if startedtracing:
+                    tracemalloc.stop()
+            else:
+                peak = None
+            # Rows of the organ table (the first argument), not of the other tables such as the temperature data
+            table = args[0] if args else next(iter(kwargs.values()), None)
+            rows = len(table) if isinstance(table, (pd.DataFrame, pd.Series, np.ndarray, organtable)) else 0
+            if rows == 0 and isinstance(result, tuple): # e.g. complement returns the tables of leaves and fruits
+                rows = sum(len(value) for value in result if isinstance(value, (pd.DataFrame, organtable)))
+            self.record(stage, seconds=seconds, rows=rows, peak_bytes=peak, called=True, failed=int(failed), **counters)
+
+    def count(self, stage, **counters):
+        """
+        Adding stage-specific counters to the innermost running call of the stage, e.g. counters of DVSI counted in DVSI_array called by DVSI.
+        If the stage is not running, the counters are recorded for it without a call.
+        """
+
+        for _stage, current in reversed(self.running):
+            if _stage == stage:
+                for key, value in counters.items():
+                    current[key] = current.get(key, 0) + value
+                return
+        self.record(stage, called=False, **counters)
+
+    def record(self, stage, seconds=0.0, rows=0, peak_bytes=None, called=True, **counters):
+        stats = self.stats.setdefault(stage, {'calls':0, 'seconds':0.0, 'rows':0, 'peak_bytes':None})
+        if called:
+            stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['rows'] += rows
+        if peak_bytes is not None:
+            stats['peak_bytes'] = max(stats['peak_bytes'] or 0, peak_bytes)
+        for key, value in counters.items():
+            stats[key] = stats.get(key, 0) + value
+        event = {'stage':stage, 'seconds':seconds, 'rows':rows, 'peak_bytes':peak_bytes, **counters}
+        for callback in self.callbacks:
+            callback(event)
+
+    def summary(self):
+        """
+        Metrics of all the stages as a pandas DataFrame (one row per stage, sorted by total time).
+        """
+
+        df = pd.DataFrame.from_dict(self.stats, orient='index')
+        df.index.name = 'stage'
+        if df.shape[0] > 0:
+            df = df.sort_values('seconds', ascending=False)
+        return df
+
+    def report(self):
+        """
+        Metrics of all the stages as a text table.
+        """
+
+        return self.summary().to_string()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Process-pool execution of the initialization pipeline of shootappearance.dataset (MIT license).
+import traceback
+import concurrent.futures
+import numpy as np
+from .main import dataset
+from .climate import dailytemp
+
+def initialvalues(dfleafnum, dffruitnum, dfleafsize, dffruitsize, date, dftemp, coldate='Date', coltemp='Temp', maxfruitsonbranch=10, nfruit=np.nan, DMC=0.08, SLA=0.05, inibfruit=7, inicfruit=0.1, inibleaf=7, inicleaf=0.1, idtrussmax=60, previous=None, asorgans=False, **kwargs):
+    """
+    Running the whole initialization pipeline of a plant, i.e. complement -> DVSI -> Gompertz_fit -> interpolate_and_Gompertz_est -> initial_fruit/initial_leaf -> twoddf.
+
+    Arguments
+    --------
+    dfleafnum, dffruitnum, dfleafsize, dffruitsize: pandas DataFrame
+        Same as shootappearance.dataset.
+    date: string
+        The date when the plant appearance measured. Format should be '%Y-%m-%d', e.g. '2024-01-01'
+    dftemp: pandas DataFrame or shootappearance.dailytemp
+        Data including date and daily average temperature [C]. Passing a dailytemp avoids parsing the dates in every call.
+    coldate, coltemp: string
+        Column names of date and temperature, used if dftemp is a dataframe.
+    maxfruitsonbranch, nfruit:
+        Same as shootappearance.dataset.complement.
+    DMC: float
+        Fruit dry matter content.
+    SLA: float
+        Specific leaf area [m2/gDM].
+    inibfruit, inicfruit, inibleaf, inicleaf: float
+        Initial values of Gompertz parameters b and c for fruits and leaves.
+    idtrussmax: integer
+        Number of rows of the 2d tables.
+    previous: dict
+        Output of this function for the same plant measured on an earlier date.
+        The organs which already existed keep their emergence dates and their DVSI is integrated only over the days after the earlier date, and the Gompertz fitting is warm-started from the earlier parameters.
+    asorgans: bool
+        If True, the organ tables dffruit and dfleaf are shootappearance.organtable instead of dataframes, and the date tables DOEFI and DOELI have datetime64 columns.
+    kwargs:
+        Other arguments of shootappearance.dataset (column names, units, ncompleaf and ncompfruit).
+
+    Outputs
+    --------
+    result: dict
+        nleafonplant, nfruitave, nbranchontruss, DVS, measureddate, poptfruit, poptleaf, the organ tables dffruit and dfleaf (with DVSF and DVSL) and the 2d tables FFI, FDI, DOEFI, DVSFI, LAI, LVI, DOELI and LVAGEI.
+    """
+
+    if not isinstance(dftemp, dailytemp):
+        dftemp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+    shootdata = dataset(dfleafnum=dfleafnum, dffruitnum=dffruitnum, dfleafsize=dfleafsize, dffruitsize=dffruitsize, **kwargs)
+    nleafonplant, nfruitave, nbranchontruss, dfleaf, dffruit, DVS, measureddate = shootdata.complement(date, maxfruitsonbranch=maxfruitsonbranch, nfruit=nfruit, asorgans=asorgans)
+
+    if previous is None:
+        previous = {'measureddate':None, 'dffruit':None, 'dfleaf':None, 'poptfruit':None, 'poptleaf':None}
+
+    # Fruit
+    start = None
+    if previous['dffruit'] is not None:
+        dffruit = shootdata.carryover(dffruit, 'DOEF', 'FAGE', measureddate, previous['dffruit'], previous['measureddate'])
+        start = shootdata.previousDVSI(dffruit, 'DOEF', 'DVSF', previous['dffruit'])
+    dffruit['DVSF'] = shootdata.DVSI_array(doe=dffruit['DOEF'], measureddate=measureddate, date=dftemp.day, temp=dftemp.temp, start=start, startdate=previous['measureddate'], fingerprint=dftemp.fingerprint)
+    poptfruit, pcovfruit, ymaxfruit = shootdata.Gompertz_fit(df=dffruit, x='DVSF', y='value', inib=inibfruit, inic=inicfruit, p0=previous['poptfruit'])
+    dffruitest = shootdata.interpolate_and_Gompertz_est(df=dffruit, colx='DVSF', coly='value', Gompparams=poptfruit)
+    dffruitinit = shootdata.initial_fruit(df=dffruitest, coldiameter='value', DMC=DMC)
+
+    # Leaf
+    start = None
+    if previous['dfleaf'] is not None:
+        dfleaf = shootdata.carryover(dfleaf, 'DOEL', 'LVAGE', measureddate, previous['dfleaf'], previous['measureddate'])
+        start = shootdata.previousDVSI(dfleaf, 'DOEL', 'DVSL', previous['dfleaf'])
+    dfleaf['DVSL'] = shootdata.DVSI_array(doe=dfleaf['DOEL'], measureddate=measureddate, date=dftemp.day, temp=dftemp.temp, start=start, startdate=previous['measureddate'], fingerprint=dftemp.fingerprint)
+    poptleaf, pcovleaf, ymaxleaf = shootdata.Gompertz_fit(df=dfleaf, x='DVSL', y='value', inib=inibleaf, inic=inicleaf, p0=previous['poptleaf'])
+    dfleafest = shootdata.interpolate_and_Gompertz_est(df=dfleaf, colx='DVSL', coly='value', Gompparams=poptleaf)
+    dfleafinit = shootdata.initial_leaf(df=dfleafest, colarea='value', SLA=SLA)
+
+    result = {'nleafonplant':nleafonplant, 'nfruitave':nfruitave, 'nbranchontruss':nbranchontruss, 'DVS':DVS, 'measureddate':measureddate, 'poptfruit':poptfruit, 'poptleaf':poptleaf, 'dffruit':dffruit, 'dfleaf':dfleaf}
+    fruittables = shootdata.twoddfs(df=dffruitinit, coltruss='id_truss', colindiv='id_fruit', colvalues=['FF', 'FD', 'DOEF', 'DVSF'], idtrussmax=idtrussmax, output='dataframe')
+    leaftables = shootdata.twoddfs(df=dfleafinit, coltruss='id_truss', colindiv='id_leaf', colvalues=['LA', 'LV', 'DOEL', 'LVAGE'], idtrussmax=idtrussmax, output='dataframe')
+    for colvalue, table in list(fruittables.items()) + list(leaftables.items()):
+        result[colvalue+'I'] = table
+    return result
+
+# Temperature series of a worker process. It is set once by the initializer of the pool, so it is not pickled for every task.
+_workertemp = {}
+
+def _initworker(dftemp):
+    _workertemp['dftemp'] = dftemp
+
+def _runchunk(jobs):
+    results = []
+    for job in jobs:
+        try:
+            results.append({'status':'ok', 'result':initialvalues(dftemp=_workertemp['dftemp'], **job), 'error':None})
+        except Exception: # e.g. RuntimeError of curve_fit when the fitting did not converge
+            results.append({'status':'failed', 'result':None, 'error':traceback.format_exc()})
+    return results
+
+def runpool(jobs, dftemp, coldate='Date', coltemp='Temp', max_workers=None, chunksize=16):
+    """
+    Running initialvalues() for many plants and measurement dates on a process pool.
+    The temperature series is parsed once and sent once to each worker process.
+    The jobs are submitted in chunks of 'chunksize' jobs to reduce the inter-process communication.
+
+    Arguments
+    --------
+    jobs: list of dict
+        Arguments of initialvalues() except dftemp, e.g. {'dfleafnum':..., 'dffruitnum':..., 'dfleafsize':..., 'dffruitsize':..., 'date':'2024-01-01', 'ncompleaf':2}
+    dftemp: pandas DataFrame or shootappearance.dailytemp
+        Data including date and daily average temperature [C].
+    coldate: string
+        Column name of date.
+    coltemp: string
+        Column name of temperature.
+    max_workers: integer
+        Number of worker processes. The default is the number of processors.
+    chunksize: integer
+        Number of jobs in a task.
+
+    Outputs
+    --------
+    results: list of dict
+        One dict per job, in the same order as jobs, with the keys 'status' ('ok' or 'failed'), 'result' (output of initialvalues() or None) and 'error' (traceback string or None).
+        A failed job does not stop the other jobs.
+    """
+
+    if not isinstance(dftemp, dailytemp):
+        dftemp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+    jobs = list(jobs)
+    chunks = [jobs[i:i+chunksize] for i in range(0, len(jobs), chunksize)]
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_initworker, initargs=(dftemp,)) as executor:
+        futures = {executor.submit(_runchunk, chunk): i for i, chunk in enumerate(chunks)}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                chunkresults = future.result()
+            except Exception: # e.g. a worker process died
+                error = traceback.format_exc()
+                chunkresults = [{'status':'failed', 'result':None, 'error':error} for job in chunks[i]]
+            results[i*chunksize:i*chunksize+len(chunkresults)] = chunkresults
+    return results
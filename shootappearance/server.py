@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# Local asyncio service of the initialization pipeline of shootappearance.dataset (MIT license).
+# Usage:
+#   python -m shootappearance.server --temp dftemp.csv --port 8765
+#   python -m shootappearance.server --temp dftemp.csv --unix /tmp/shootappearance.sock
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import datetime
+import collections
+import http.client
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from .main import lrucache
+from .climate import dailytemp
+from .runner import _initworker, _runchunk
+
+# Arguments of shootappearance.runner.initialvalues given as tables in a request
+TABLES = ['dfleafnum', 'dffruitnum', 'dfleafsize', 'dffruitsize']
+# 2d tables and scalars of the output of initialvalues returned in a response
+OUTPUTTABLES = ['FFI', 'FDI', 'DOEFI', 'DVSFI', 'LAI', 'LVI', 'DOELI', 'LVAGEI']
+OUTPUTSCALARS = ['nleafonplant', 'nfruitave', 'nbranchontruss', 'DVS', 'measureddate', 'poptfruit', 'poptleaf']
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+class ttlcache(lrucache):
+    """
+    LRU cache whose values expire 'ttl' seconds after they are stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        super().__init__(maxsize=maxsize)
+        self.ttl = ttl
+        self.expired = 0
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None:
+            return None
+        stored, value = value
+        if time.monotonic() - stored > self.ttl:
+            del self.store[key]
+            self.hits -= 1
+            self.misses += 1
+            self.expired += 1
+            return None
+        return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic(), value))
+
+    def info(self):
+        return {**super().info(), 'ttl': self.ttl, 'expired': self.expired}
+
+def _jsonvalue(value):
+    """A value of an output as a JSON value. Missing values (NaN, NaT) are null and dates are 'YYYY-MM-DD'."""
+    if isinstance(value, np.ndarray):
+        return [_jsonvalue(v) for v in value.tolist()]
+    if isinstance(value, (list, tuple)):
+        return [_jsonvalue(v) for v in value]
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else str(value.astype('datetime64[D]'))
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def _servejob(job):
+    """
+    Running initialvalues() for a request in a worker and encoding the output as JSON, so that the event loop only sends bytes.
+    """
+
+    job = dict(job)
+    for name in TABLES:
+        job[name] = pd.DataFrame(job[name])
+    output = _runchunk([job])[0]
+    if output['status'] != 'ok':
+        return False, json.dumps({'status':'failed', 'error':output['error']}).encode()
+    result = output['result']
+    encoded = {name: _jsonvalue(result[name]) for name in OUTPUTSCALARS}
+    for name in OUTPUTTABLES:
+        table = result[name]
+        encoded[name] = {'columns':[_jsonvalue(column) for column in table.columns], 'data':[[_jsonvalue(v) for v in row] for row in table.to_numpy(dtype=object)]}
+    return True, json.dumps(encoded).encode()
+
+def requestkey(body):
+    """Hash of a request, independent of the order of keys and the formatting of the JSON."""
+    return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+class service:
+    def __init__(self, dftemp, coldate='Date', coltemp='Temp', host='127.0.0.1', port=8765, path=None, max_workers=None, maxsize=1024, ttl=3600.0, nlatency=1024):
+        """
+        Local HTTP service returning the initial values for TOMULATION of plants, so that simulator instances on the same host share the computations.
+        The pipeline (shootappearance.runner.initialvalues) runs on a process pool, and the event loop only parses requests and sends responses.
+        Concurrent identical requests are coalesced into one computation, and results are cached with LRU eviction and a time to live, keyed by a hash of the request.
+        Everything runs locally, without network access other than the local socket.
+
+        Endpoints
+        ----------
+        POST /initialvalues
+            JSON body with the tables dfleafnum, dffruitnum, dfleafsize and dffruitsize (each a dict of columns or a list of records), 'date' ('YYYY-MM-DD') and other arguments of initialvalues (e.g. ncompleaf, DMC, SLA).
+            Response: {'status':'ok', 'cached':bool, 'coalesced':bool, 'result':{...}} with nleafonplant, nfruitave, nbranchontruss, DVS, measureddate, poptfruit, poptleaf and the 2d tables FFI, FDI, DOEFI, DVSFI, LAI, LVI, DOELI and LVAGEI as {'columns':[...], 'data':[[...]]} (NaN is null, dates are 'YYYY-MM-DD').
+            A failed computation returns status 422 with the traceback in 'error', and is not cached.
+        GET /metrics
+            Numbers of requests, computations, coalesced requests and cache hits, latency percentiles [s] and throughput [requests/s].
+        GET /health
+            {'status':'ok'}.
+
+        Arguments
+        ----------
+        dftemp: pandas DataFrame or shootappearance.dailytemp
+            Data including date and daily average temperature [C], sent once to each worker process.
+        coldate, coltemp: string
+            Column names of date and temperature of dftemp.
+        host, port:
+            Address of the TCP socket. The default host accepts only local connections.
+        path: string
+            Path of a Unix socket. If given, it is used instead of host and port.
+        max_workers: integer
+            Number of worker processes. The default is the number of processors.
+        maxsize: integer
+            Maximum number of cached results.
+        ttl: float
+            Time to live of cached results [s].
+        nlatency: integer
+            Number of latest requests of which latencies are kept for the percentiles.
+        """
+
+        if not isinstance(dftemp, dailytemp):
+            dftemp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+        self.dftemp = dftemp
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_workers = max_workers
+        self.cache = ttlcache(maxsize=maxsize, ttl=ttl)
+        self.inflight = {} # Request key -> asyncio.Future of the computation
+        self.connections = {} # asyncio.Task serving a connection -> its writer
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=nlatency)
+        self.computeseconds = 0.0
+        self.executor = None
+        self.server = None
+        self.started = None
+
+    async def start(self):
+        """Starting the worker pool and the server."""
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers, initializer=_initworker, initargs=(self.dftemp,))
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host=self.host, port=self.port)
+            self.port = self.server.sockets[0].getsockname()[1] # The port chosen by the system if port=0
+        self.started = time.monotonic()
+        return self
+
+    async def close(self):
+        """Closing the server and the open connections, and shutting the worker pool down."""
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.connections.values()):
+                writer.close() # Idle keep-alive connections end with EOF
+            if self.connections:
+                await asyncio.wait(list(self.connections))
+            await self.server.wait_closed()
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    def run(self):
+        """Running the service until interrupted (e.g. Ctrl+C)."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    async def initialvalues(self, body):
+        """
+        Output of initialvalues() for a request body as (status, cached, coalesced, JSON bytes), from the cache, from a running computation of the same request, or from a new computation.
+        """
+
+        key = requestkey(body)
+        value = self.cache.get(key)
+        if value is not None:
+            self.counters['cachehits'] += 1
+            return 200, True, False, value
+        if key in self.inflight:
+            self.counters['coalesced'] += 1
+            status, value = await asyncio.shield(self.inflight[key])
+            return status, False, True, value
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            start = time.perf_counter()
+            ok, value = await asyncio.get_running_loop().run_in_executor(self.executor, _servejob, body)
+            self.computeseconds += time.perf_counter() - start
+            self.counters['computations'] += 1
+            status = 200 if ok else 422
+            if ok:
+                self.cache.put(key, value)
+            else:
+                self.counters['failed'] += 1
+            future.set_result((status, value))
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # The waiting requests get the exception. This marks it as retrieved if no request is waiting.
+            raise
+        finally:
+            del self.inflight[key]
+        return status, False, False, value
+
+    def metrics(self):
+        uptime = time.monotonic() - self.started if self.started is not None else 0.0
+        latencies = sorted(self.latencies)
+        percentile = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else None
+        return {
+            'uptime': uptime, 'requests': self.counters['requests'], 'errors': self.counters['errors'],
+            'computations': self.counters['computations'], 'failed': self.counters['failed'], 'coalesced': self.counters['coalesced'], 'cachehits': self.counters['cachehits'],
+            'inflight': len(self.inflight), 'cache': self.cache.info(),
+            'latency_p50': percentile(0.5), 'latency_p90': percentile(0.9), 'latency_p99': percentile(0.99), 'latency_max': latencies[-1] if latencies else None,
+            'compute_seconds_mean': self.computeseconds / self.counters['computations'] if self.counters['computations'] else None,
+            'requests_per_second': self.counters['requests'] / uptime if uptime > 0 else None,
+        }
+
+    async def respond(self, method, target, body):
+        """(HTTP status, JSON bytes) of a request."""
+        if target == '/initialvalues':
+            if method != 'POST':
+                return 405, json.dumps({'status':'failed', 'error':'Use POST.'}).encode()
+            try:
+                body = json.loads(body)
+                missing = [name for name in TABLES + ['date'] if name not in body]
+                if missing:
+                    raise ValueError('Missing ' + ', '.join(missing) + '.')
+                if 'previous' in body:
+                    raise ValueError('previous is not supported by the service.')
+            except ValueError as e: # including json.JSONDecodeError
+                return 400, json.dumps({'status':'failed', 'error':str(e)}).encode()
+            status, cached, coalesced, value = await self.initialvalues(body)
+            if status != 200:
+                return status, value
+            return 200, b'{"status":"ok","cached":' + json.dumps(cached).encode() + b',"coalesced":' + json.dumps(coalesced).encode() + b',"result":' + value + b'}'
+        if target == '/metrics':
+            return 200, json.dumps(self.metrics()).encode()
+        if target == '/health':
+            return 200, b'{"status":"ok"}'
+        return 404, json.dumps({'status':'failed', 'error':'Unknown path ' + target}).encode()
+
+    async def handle(self, reader, writer):
+        """Serving the HTTP/1.1 requests of a connection (keep-alive unless the client closes it)."""
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                requestline = await reader.readline()
+                if not requestline:
+                    break
+                start = time.perf_counter()
+                method, target, version = requestline.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                self.counters['requests'] += 1
+                try:
+                    status, payload = await self.respond(method, target.split('?')[0], body)
+                except Exception as e: # e.g. a worker process died
+                    status, payload = 500, json.dumps({'status':'failed', 'error':repr(e)}).encode()
+                if status != 200:
+                    self.counters['errors'] += 1
+                keepalive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n' % (status, REASONS[status], len(payload), 'keep-alive' if keepalive else 'close')).encode() + payload)
+                await writer.drain()
+                self.latencies.append(time.perf_counter() - start)
+                if not keepalive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError): # Malformed request or closed connection
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+
+def request(payload, host='127.0.0.1', port=8765, path='/initialvalues', timeout=600):
+    """
+    Client of the service for simulator processes, e.g. request({'dfleafnum':dfleafnum.to_dict('list'), ..., 'date':'2024-01-01', 'ncompleaf':2}).
+    Returns the decoded JSON response. payload None sends a GET request (e.g. path='/metrics').
+    """
+
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        if payload is None:
+            connection.request('GET', path)
+        else:
+            connection.request('POST', path, body=json.dumps(payload), headers={'Content-Type':'application/json'})
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Local service of the initial values for TOMULATION.')
+    argparser.add_argument('--temp', required=True, help='csv file of daily average temperature.')
+    argparser.add_argument('--coldate', default='Date')
+    argparser.add_argument('--coltemp', default='Temp')
+    argparser.add_argument('--host', default='127.0.0.1')
+    argparser.add_argument('--port', type=int, default=8765)
+    argparser.add_argument('--unix', default=None, help='Path of a Unix socket used instead of host and port.')
+    argparser.add_argument('--workers', type=int, default=None)
+    argparser.add_argument('--maxsize', type=int, default=1024)
+    argparser.add_argument('--ttl', type=float, default=3600.0)
+    args = argparser.parse_args()
+    shootservice = service(dailytemp.readcsv(args.temp, args.coldate, args.coltemp), host=args.host, port=args.port, path=args.unix, max_workers=args.workers, maxsize=args.maxsize, ttl=args.ttl)
+    print('Serving on ' + (args.unix if args.unix else '%s:%d' % (args.host, args.port)), file=sys.stderr)
+    shootservice.run()
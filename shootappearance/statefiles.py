@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Binary files of the initial values for TOMULATION of many plants (MIT license).
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+
+# 2d tables of shootappearance.runner.initialvalues: name -> (dtype, organ)
+TABLES = {
+    'FFI': ('float64', 'fruit'), 'FDI': ('float64', 'fruit'), 'DOEFI': ('datetime64[D]', 'fruit'), 'DVSFI': ('float64', 'fruit'),
+    'LAI': ('float64', 'leaf'), 'LVI': ('float64', 'leaf'), 'DOELI': ('datetime64[D]', 'leaf'), 'LVAGEI': ('float64', 'leaf'),
+}
+# Scalar outputs of shootappearance.runner.initialvalues: name -> dtype
+METADATA = {'measureddate': 'datetime64[D]', 'DVS': 'float64', 'nleafonplant': 'float64', 'nfruitave': 'float64', 'nbranchontruss': 'float64'}
+VERSION = 1
+
+def _todays(values):
+    """Dates (datetime.date, strings, datetime64, or NaN/None for missing) as a numpy datetime64[D] array of the same shape, with NaT for missing dates."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[D]')
+    flat = values.ravel()
+    missing = pd.isna(flat)
+    days = np.full(flat.shape[0], np.datetime64('NaT'), dtype='datetime64[D]')
+    days[~missing] = pd.to_datetime(pd.Series(flat[~missing], dtype=object)).to_numpy().astype('datetime64[D]')
+    return days.reshape(values.shape)
+
+class statefile:
+    def __init__(self, path, mmap=True):
+        """
+        Initial values for TOMULATION of many plants stored in a directory of flat binary files.
+        Each 2d table (FFI, FDI, DOEFI, DVSFI, LAI, LVI, DOELI and LVAGEI) is a file of contiguous typed values (float64, and datetime64[D] for dates) of shape (number of plants, idtrussmax, nfruitmax or nleafmax), and the metadata (measureddate, DVS, nleafonplant, nfruitave and nbranchontruss) are files of shape (number of plants,).
+        header.json keeps the shapes, the plant ids and the numbers of columns of the fruit and leaf tables of each plant before padding. Plants are appended at the end of the files without rewriting them, and the header is replaced only after the data are written, so an interrupted append leaves the file as it was.
+        The files are memory-mapped, so reading one plant reads only the pages of that plant.
+        A new file is made by 'def create()'.
+
+        Arguments
+        ----------
+        path: string
+            Path of the directory.
+        mmap: bool
+            If True (default), the tables are memory-mapped instead of read at once.
+        """
+
+        self.path = path
+        self.mmap = mmap
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        if self.header['version'] != VERSION:
+            raise ValueError('Unsupported version of statefile: %s' % self.header['version'])
+        self.arrays = {}
+
+    @classmethod
+    def create(cls, path, idtrussmax=60, nfruitmax=50, nleafmax=10, overwrite=False):
+        """
+        Making a new empty file.
+
+        Arguments
+        ----------
+        path: string
+            Path of the directory. It is made if it does not exist.
+        idtrussmax: integer
+            Number of rows of the 2d tables.
+        nfruitmax, nleafmax: integer
+            Number of columns of the 2d tables of fruits and leaves, i.e. the maximum number of fruits on a truss and of leaves under a truss. Narrower tables are padded with NaN (NaT for dates).
+        overwrite: bool
+            If False (default), an existing file raises FileExistsError.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, 'header.json')) and not overwrite:
+            raise FileExistsError('statefile already exists: %s' % path)
+        for name in list(TABLES) + list(METADATA):
+            open(os.path.join(path, name + '.bin'), 'wb').close()
+        header = {'version':VERSION, 'idtrussmax':int(idtrussmax), 'nfruitmax':int(nfruitmax), 'nleafmax':int(nleafmax), 'plants':[], 'measureddates':[], 'ncolumns':[]}
+        cls._writeheader(path, header)
+        return cls(path)
+
+    @staticmethod
+    def _writeheader(path, header):
+        temporary = os.path.join(path, 'header.json.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(header, f)
+        os.replace(temporary, os.path.join(path, 'header.json'))
+
+    def __len__(self):
+        return len(self.header['plants'])
+
+    @property
+    def plants(self):
+        """Plant ids in the order of the first axis of the tables."""
+        return list(self.header['plants'])
+
+    def shape(self, name):
+        """Shape of a table or metadata of all the plants."""
+        if name in METADATA:
+            return (len(self),)
+        ncol = self.header['nfruitmax'] if TABLES[name][1] == 'fruit' else self.header['nleafmax']
+        return (len(self), self.header['idtrussmax'], ncol)
+
+    def __getitem__(self, name):
+        """
+        A table (e.g. statefile['FFI'], shape (number of plants, idtrussmax, nfruitmax)) or metadata (e.g. statefile['DVS']) of all the plants, read-only.
+        """
+
+        if name not in self.arrays:
+            dtype = np.dtype(METADATA[name] if name in METADATA else TABLES[name][0])
+            shape = self.shape(name)
+            filename = os.path.join(self.path, name + '.bin')
+            if shape[0] == 0:
+                array = np.empty(shape, dtype=dtype)
+            elif self.mmap:
+                array = np.memmap(filename, dtype=dtype, mode='r', shape=shape)
+            else:
+                array = np.fromfile(filename, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            self.arrays[name] = array
+        return self.arrays[name]
+
+    def index(self, idplant, measureddate=None):
+        """
+        Position of a plant in the tables. If the plant was stored for several dates and measureddate is None, the latest one is returned.
+        """
+
+        positions = [i for i, _idplant in enumerate(self.header['plants']) if _idplant == idplant]
+        if measureddate is not None:
+            measureddate = str(_todays(np.array([measureddate], dtype=object))[0])
+            positions = [i for i in positions if self.header['measureddates'][i] == measureddate]
+        if not positions:
+            raise KeyError('Plant %s is not in the statefile.' % repr(idplant))
+        return max(positions, key=lambda i: self.header['measureddates'][i])
+
+    def append(self, idplant, result):
+        """
+        Appending the initial values of a plant.
+
+        Arguments
+        ----------
+        idplant: integer or string
+            Plant id.
+        result: dict
+            Output of shootappearance.runner.initialvalues (or a dict with the same keys). Tables may be dataframes in the layout of shootappearance.dataset.twoddf or 2d arrays without the id_truss column.
+        """
+
+        self.extend([(idplant, result)])
+
+    def extend(self, items):
+        """
+        Appending many plants at once, with one update of the header.
+
+        Arguments
+        ----------
+        items: iterable of tuple or dict
+            Pairs of (plant id, result) as in 'def append()', or a dict {plant id: result}.
+        """
+
+        items = list(items.items()) if isinstance(items, dict) else list(items)
+        keys = set(zip(self.header['plants'], self.header['measureddates']))
+        plants = []
+        measureddates = []
+        ncolumns = []
+        buffers = {name: [] for name in list(TABLES) + list(METADATA)}
+        for idplant, result in items:
+            idplant = idplant.item() if isinstance(idplant, np.generic) else idplant
+            for name in METADATA:
+                dtype = METADATA[name]
+                value = _todays(np.array([result[name]], dtype=object)) if dtype.startswith('datetime64') else np.array([result[name]], dtype=dtype)
+                buffers[name].append(value)
+            measureddate = str(buffers['measureddate'][-1][0])
+            if (idplant, measureddate) in keys:
+                raise ValueError('Plant %s measured on %s is already in the statefile.' % (repr(idplant), measureddate))
+            keys.add((idplant, measureddate))
+            width = {}
+            for name, (dtype, organ) in TABLES.items():
+                table, width[organ] = self._table(name, result[name])
+                buffers[name].append(table[None])
+            plants.append(idplant)
+            measureddates.append(measureddate)
+            ncolumns.append([width['fruit'], width['leaf']])
+
+        # Writing after the current end of the files, which also drops data left by an interrupted append
+        n = len(self)
+        for name, arrays in buffers.items():
+            if not arrays:
+                continue
+            dtype = np.dtype(METADATA[name] if name in METADATA else TABLES[name][0])
+            offset = n * int(np.prod(self.shape(name)[1:])) * dtype.itemsize
+            with open(os.path.join(self.path, name + '.bin'), 'r+b') as f:
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(np.ascontiguousarray(np.concatenate(arrays), dtype=dtype).tobytes())
+        header = dict(self.header)
+        header['plants'] = self.header['plants'] + plants
+        header['measureddates'] = self.header['measureddates'] + measureddates
+        header['ncolumns'] = self._ncolumns() + ncolumns
+        self._writeheader(self.path, header)
+        self.header = header
+        self.arrays = {}
+
+    def _ncolumns(self):
+        """[number of fruit columns, number of leaf columns] of each plant. Files without them are read with the padded widths."""
+        return self.header.get('ncolumns', [[self.header['nfruitmax'], self.header['nleafmax']]] * len(self))
+
+    def _table(self, name, table):
+        """A 2d table padded to the shape of the file, and the number of columns before padding."""
+        dtype, organ = TABLES[name]
+        if isinstance(table, pd.DataFrame):
+            table = table.drop(columns='id_truss', errors='ignore').to_numpy()
+        values = _todays(table) if dtype.startswith('datetime64') else np.asarray(table, dtype=float)
+        shape = self.shape(name)[1:]
+        if values.shape[0] != shape[0] or values.shape[1] > shape[1]:
+            raise ValueError('Table %s of shape %s does not fit the statefile (%d trusses, %d %ss).' % (name, values.shape, shape[0], shape[1], organ))
+        padded = np.full(shape, np.datetime64('NaT') if dtype.startswith('datetime64') else np.nan, dtype=dtype)
+        padded[:, :values.shape[1]] = values
+        return padded, int(values.shape[1])
+
+    def metadata(self):
+        """
+        Metadata of all the plants as a pandas DataFrame with id_plant, measureddate, DVS, nleafonplant, nfruitave and nbranchontruss.
+        """
+
+        df = pd.DataFrame({name: np.asarray(self[name]) for name in METADATA})
+        df.insert(0, 'id_plant', self.plants)
+        return df
+
+    def plant(self, idplant, measureddate=None, asdataframe=False):
+        """
+        Initial values of a plant.
+
+        Arguments
+        ----------
+        idplant: integer or string
+            Plant id.
+        measureddate: string or date
+            Measurement date, if the plant was stored for several dates. If None, the latest one.
+        asdataframe: bool
+            If False (default), the tables are 2d numpy arrays (views of the memory-mapped files) padded to nfruitmax or nleafmax columns. If True, they are dataframes with the columns of the plant before padding, in the layout of shootappearance.dataset.twoddf with dates as datetime.date, i.e. the same as the output of shootappearance.runner.initialvalues.
+
+        Outputs
+        --------
+        result: dict
+            Metadata and tables of the plant.
+        """
+
+        i = self.index(idplant, measureddate)
+        ncolumns = dict(zip(['fruit', 'leaf'], self._ncolumns()[i]))
+        result = {name: self[name][i] for name in METADATA}
+        result['measureddate'] = result['measureddate'].astype(datetime.date)
+        result['DVS'] = float(result['DVS'])
+        for name in ['nleafonplant', 'nfruitave', 'nbranchontruss']: # Numbers are integers unless they were given as fractions (e.g. nfruit of initialvalues)
+            value = float(result[name])
+            result[name] = int(value) if value.is_integer() else value
+        for name, (dtype, organ) in TABLES.items():
+            table = self[name][i]
+            if asdataframe:
+                table = table[:, :ncolumns[organ]]
+                if table.dtype.kind == 'M':
+                    missing = np.isnat(table)
+                    table = table.astype(object)
+                    table[missing] = np.nan
+                table = pd.DataFrame(table, columns=range(1, table.shape[1]+1))
+                table.insert(0, 'id_truss', np.arange(1, table.shape[0]+1))
+            result[name] = table
+        return result
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Streaming initialization of many plants from large measurement files (MIT license).
+import os
+import itertools
+import traceback
+import collections
+import concurrent.futures
+import pandas as pd
+from .climate import dailytemp
+from .runner import initialvalues, _initworker, _runchunk
+
+def readgroups(path, keys, chunksize=100000, **kwargs):
+    """
+    Reading a csv file in chunks and yielding (key, dataframe) for each group of consecutive rows with the same values of the key columns.
+    A group is yielded as soon as a row of the next group is read, so only the rows of the current group and one chunk are kept in memory.
+    The rows of a group must be consecutive in the file (e.g. the file is sorted by plant and date). A group appearing again later raises ValueError.
+
+    Arguments
+    --------
+    path: string or file-like
+        csv file.
+    keys: list of string
+        Column names of the group key, e.g. ['id_plant', 'date'].
+    chunksize: integer
+        Number of rows read at once.
+    kwargs:
+        Other arguments of pandas.read_csv.
+    """
+
+    seen = set()
+    pending = None
+    for chunk in pd.read_csv(path, chunksize=chunksize, encoding=kwargs.pop('encoding', 'utf-8-sig'), **kwargs):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        keyvalues = list(zip(*[chunk[key].tolist() for key in keys]))
+        # Rows where a new group starts
+        starts = [0] + [i for i in range(1, len(keyvalues)) if keyvalues[i] != keyvalues[i-1]]
+        for start, end in zip(starts[:-1], starts[1:]):
+            key = keyvalues[start]
+            if key in seen:
+                raise ValueError('Rows of %s are not consecutive in %s.' % (repr(key), path))
+            seen.add(key)
+            yield key, chunk.iloc[start:end].reset_index(drop=True)
+        pending = chunk.iloc[starts[-1]:].reset_index(drop=True) if len(keyvalues) > 0 else None
+    if pending is not None and pending.shape[0] > 0:
+        key = tuple(pending[keys].iloc[:1].to_numpy().tolist()[0])
+        if key in seen:
+            raise ValueError('Rows of %s are not consecutive in %s.' % (repr(key), path))
+        yield key, pending
+
+def streamplants(leafnumpath, fruitnumpath, leafsizepath, fruitsizepath, dftemp, colplant='id_plant', colmeasured='date', coldate='Date', coltemp='Temp', chunksize=100000, max_workers=1, readargs=None, **kwargs):
+    """
+    Initial values for TOMULATION of every plant in farm-scale measurement files, yielded one plant at a time.
+    The four files have the columns of dfleafnum, dffruitnum, dfleafsize and dffruitsize plus a plant id column (colplant) and a measurement date column (colmeasured).
+    The files are read in chunks, and as soon as the rows of a (plant, date) are complete in all the files, shootappearance.runner.initialvalues is run for it and the result is yielded, so the memory used does not depend on the size of the files.
+
+    The rows of each (plant, date) must be consecutive, and the (plant, date) groups must appear in the same order in the four files, as in exports sorted by plant and date. Otherwise ValueError is raised.
+
+    Arguments
+    --------
+    leafnumpath, fruitnumpath, leafsizepath, fruitsizepath: string or file-like
+        csv files of leaf numbers, fruit numbers, leaf sizes and fruit sizes.
+    dftemp: pandas DataFrame or shootappearance.dailytemp
+        Data including date and daily average temperature [C].
+    colplant, colmeasured: string
+        Column names of plant id and measurement date.
+    coldate, coltemp: string
+        Column names of date and temperature of dftemp.
+    chunksize: integer
+        Number of rows read at once from each file.
+    max_workers: integer
+        Number of worker processes. If more than 1, plants are initialized on a process pool while the files are read, with at most 2 * max_workers plants in progress.
+    readargs: dict
+        Other arguments of pandas.read_csv.
+    kwargs:
+        Other arguments of shootappearance.runner.initialvalues (e.g. ncompleaf, DMC, SLA).
+
+    Outputs
+    --------
+    Generator of (plant id, measurement date, output), where output is a dict with the keys 'status' ('ok' or 'failed'), 'result' (output of initialvalues or None) and 'error' (traceback string or None), as in shootappearance.runner.runpool.
+    """
+
+    if not isinstance(dftemp, dailytemp):
+        dftemp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+    readargs = {} if readargs is None else readargs
+    keys = [colplant, colmeasured]
+    streams = [readgroups(path, keys, chunksize=chunksize, **readargs) for path in [leafnumpath, fruitnumpath, leafsizepath, fruitsizepath]]
+
+    def jobs():
+        names = ['leafnum', 'fruitnum', 'leafsize', 'fruitsize']
+        for groups in itertools.zip_longest(*streams):
+            if None in groups: # A file ended before the others
+                ended = [name for name, group in zip(names, groups) if group is None]
+                raise ValueError('%s ended before the other files.' % ', '.join(ended))
+            key = groups[0][0]
+            for name, (_key, group) in zip(names[1:], groups[1:]):
+                if _key != key:
+                    raise ValueError('The files are not in the same order: %s in leafnum and %s in %s.' % (repr(key), repr(_key), name))
+            frames = [group.drop(columns=keys) for _key, group in groups]
+            date = pd.Timestamp(key[1]).strftime('%Y-%m-%d')
+            yield key[0], date, {'dfleafnum':frames[0], 'dffruitnum':frames[1], 'dfleafsize':frames[2], 'dffruitsize':frames[3], 'date':date, **kwargs}
+
+    if max_workers is not None and max_workers <= 1:
+        # The temperature series is passed to every call, so generators running at the same time do not share it
+        for idplant, date, job in jobs():
+            try:
+                output = {'status':'ok', 'result':initialvalues(dftemp=dftemp, **job), 'error':None}
+            except Exception: # e.g. RuntimeError of curve_fit when the fitting did not converge
+                output = {'status':'failed', 'result':None, 'error':traceback.format_exc()}
+            yield idplant, date, output
+        return
+
+    # Bounded number of plants in progress, yielded in the order of the files
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_initworker, initargs=(dftemp,)) as executor:
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        inprogress = collections.deque()
+        for idplant, date, job in jobs():
+            inprogress.append((idplant, date, executor.submit(_runchunk, [job])))
+            while len(inprogress) >= window:
+                _idplant, _date, future = inprogress.popleft()
+                yield _idplant, _date, future.result()[0]
+        while inprogress:
+            _idplant, _date, future = inprogress.popleft()
+            yield _idplant, _date, future.result()[0]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Parameter sweeps of the initialization pipeline of shootappearance.dataset (MIT license).
+import itertools
+import traceback
+import concurrent.futures
+import pandas as pd
+from .climate import dailytemp
+from .pipelines import pipeline
+
+# Parameters of dataset and complement, which change the organ table. They vary slowest in a sweep.
+DATASETPARAMS = ['ncompleaf', 'ncompfruit', 'maxfruitsonbranch', 'nfruit']
+# Initial values of the Gompertz fitting. 'inib' and 'inic' set the values of both fruits and leaves.
+FITPARAMS = ['inib', 'inic', 'inibfruit', 'inicfruit', 'inibleaf', 'inicleaf']
+# Parameters which only scale a value (FD = FF * DMC, LV = LA / SLA), so they are evaluated as vectors without running the pipeline.
+LINEARPARAMS = ['DMC', 'SLA']
+
+def _sweepgroup(inputs, combinations, DMCs, SLAs):
+    """
+    Sweeping the combinations of DATASETPARAMS and FITPARAMS on one pipeline, so that the stages shared by consecutive combinations are reused.
+    """
+
+    shootpipeline = pipeline(**inputs)
+    rows = []
+    for combination in combinations:
+        params = dict(combination)
+        for name in ['inib', 'inic']:
+            if name in params:
+                value = params.pop(name)
+                params.setdefault(name+'fruit', value)
+                params.setdefault(name+'leaf', value)
+        try:
+            shootpipeline.set(**params)
+            outputs = shootpipeline.get('nleafonplant', 'nfruitave', 'nbranchontruss', 'DVS', 'poptfruit', 'poptleaf', 'dffruit', 'dfleaf')
+            values = {
+                'nleafonplant':outputs['nleafonplant'], 'nfruitave':outputs['nfruitave'], 'nbranchontruss':outputs['nbranchontruss'], 'DVS':outputs['DVS'],
+                'afruit':outputs['poptfruit'][0], 'bfruit':outputs['poptfruit'][1], 'cfruit':outputs['poptfruit'][2],
+                'aleaf':outputs['poptleaf'][0], 'bleaf':outputs['poptleaf'][1], 'cleaf':outputs['poptleaf'][2],
+                'nfruitorgans':outputs['dffruit'].shape[0], 'nleaforgans':outputs['dfleaf'].shape[0],
+                'FF':outputs['dffruit']['FF'].sum(), 'LA':outputs['dfleaf']['LA'].sum(), 'error':None}
+        except Exception: # e.g. RuntimeError of curve_fit when the fitting did not converge
+            values = {'error':traceback.format_exc()}
+        for DMC, SLA in itertools.product(DMCs, SLAs):
+            row = {**combination, 'DMC':DMC, 'SLA':SLA, **values}
+            if values['error'] is None:
+                row['FD'] = values['FF'] * DMC
+                row['LV'] = values['LA'] / SLA
+            rows.append(row)
+    return rows
+
+def sweep(dfleafnum, dffruitnum, dfleafsize, dffruitsize, date, dftemp, grid, coldate='Date', coltemp='Temp', max_workers=1, **fixed):
+    """
+    Evaluating the initialization pipeline for every combination of parameters in grid.
+    Inputs and the temperature series are parsed once, consecutive combinations share the stages which do not depend on the changed parameters (see shootappearance.pipeline), and DMC and SLA are evaluated as vectors.
+
+    Arguments
+    --------
+    dfleafnum, dffruitnum, dfleafsize, dffruitsize: pandas DataFrame
+        Same as shootappearance.dataset.
+    date: string
+        The date when the plant appearance measured. Format should be '%Y-%m-%d', e.g. '2024-01-01'
+    dftemp: pandas DataFrame or shootappearance.dailytemp
+        Data including date and daily average temperature [C].
+    grid: dict
+        Lists of values of parameters, e.g. {'ncompleaf':[2, 3, 4], 'DMC':[0.06, 0.07, 0.08], 'inib':[5, 7]}.
+        Parameters are ncompleaf, ncompfruit, maxfruitsonbranch, nfruit, inib, inic (both fruits and leaves), inibfruit, inicfruit, inibleaf, inicleaf, DMC and SLA.
+    coldate, coltemp: string
+        Column names of date and temperature of dftemp.
+    max_workers: integer
+        Number of processes. If more than 1, the combinations of ncompleaf, ncompfruit, maxfruitsonbranch and nfruit are shared out to a process pool.
+    fixed:
+        Other arguments of shootappearance.pipeline, which are the same in all the combinations.
+
+    Outputs
+    --------
+    result: pandas DataFrame
+        One row per combination indexed by the parameters in grid, with nleafonplant, nfruitave, nbranchontruss, DVS, Gompertz parameters (afruit, bfruit, cfruit, aleaf, bleaf, cleaf), numbers of organs, totals of FF, FD, LA and LV on the plant, and error (traceback string if the pipeline failed, otherwise None).
+    """
+
+    unknown = [name for name in grid if name not in DATASETPARAMS + FITPARAMS + LINEARPARAMS]
+    if unknown:
+        raise KeyError('Unknown parameters: ' + ', '.join(unknown))
+    if not isinstance(dftemp, dailytemp):
+        dftemp = dailytemp.fromdataframe(dftemp, coldate, coltemp)
+    inputs = {'dfleafnum':dfleafnum, 'dffruitnum':dffruitnum, 'dfleafsize':dfleafsize, 'dffruitsize':dffruitsize, 'date':date, 'dftemp':dftemp, **fixed}
+    DMCs = list(grid.get('DMC', [fixed.get('DMC', 0.08)]))
+    SLAs = list(grid.get('SLA', [fixed.get('SLA', 0.05)]))
+
+    # Combinations of the parameters which change the organ table, and of the initial values of the fitting
+    datasetnames = [name for name in DATASETPARAMS if name in grid]
+    fitnames = [name for name in FITPARAMS if name in grid]
+    datasetcombinations = [dict(zip(datasetnames, values)) for values in itertools.product(*[grid[name] for name in datasetnames])]
+    fitcombinations = [dict(zip(fitnames, values)) for values in itertools.product(*[grid[name] for name in fitnames])]
+    groups = [[{**datasetcombination, **fitcombination} for fitcombination in fitcombinations] for datasetcombination in datasetcombinations]
+
+    if max_workers is not None and max_workers <= 1:
+        rows = [row for group in groups for row in _sweepgroup(inputs, group, DMCs, SLAs)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = [row for grouprows in executor.map(_sweepgroup, [inputs]*len(groups), groups, [DMCs]*len(groups), [SLAs]*len(groups)) for row in grouprows]
+
+    result = pd.DataFrame(rows)
+    names = datasetnames + fitnames + [name for name in LINEARPARAMS if name in grid]
+    if names:
+        result = result.set_index(names)
+    result = result.drop(columns=[name for name in LINEARPARAMS if name not in grid])
+    return result
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Import time and lazy names of shootappearance (MIT license).
+import os
+import sys
+import json
+import types
+import subprocess
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from shootappearance import IMPORTBUDGET
+
+# Run in a new process, so that numpy, pandas and scipy are not imported yet
+CHILD = '''
+import sys, time, json
+start = time.perf_counter()
+import shootappearance
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds':seconds, 'modules':[name for name in ['numpy', 'pandas', 'scipy'] if name in sys.modules]}))
+'''
+
+def importchild():
+    output = subprocess.run([sys.executable, '-c', CHILD], check=True, cwd=ROOT, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def test_import_does_not_import_dependencies():
+    assert importchild()['modules'] == []
+
+def test_import_time_within_budget():
+    # The fastest of a few runs, so that a busy machine does not fail the test
+    seconds = min(importchild()['seconds'] for i in range(3))
+    assert seconds < IMPORTBUDGET, 'import shootappearance took %.4f s (budget %.4f s)' % (seconds, IMPORTBUDGET)
+
+def test_names_are_not_submodules():
+    import shootappearance
+    for name in shootappearance.__all__:
+        assert not isinstance(getattr(shootappearance, name), types.ModuleType), name
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Incremental re-initialization of re-measured plants (MIT license).
+import os
+import sys
+import numpy as np
+import pandas as pd
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from shootappearance import dataset, dailytemp, initialvalues
+
+def inputs():
+    """The example data of the repository, and the same plant one truss lower (measured a week earlier)."""
+    read = lambda name: pd.read_csv(os.path.join(ROOT, name), encoding='utf-8-sig')
+    later = [read('dfleafnum.csv'), read('dffruitnum.csv'), read('dfleafsize.csv'), read('dffruitsize.csv')]
+    earlier = [df[df['id_truss'] < df['id_truss'].max()] for df in later]
+    dates = pd.date_range('2023-01-01', '2024-03-01')
+    temp = dailytemp(dates.to_numpy(), 20 + 4 * np.sin(np.arange(dates.shape[0]) / 20))
+    return earlier, later, temp
+
+def test_incremental_equals_full_recomputation():
+    earlier, later, temp = inputs()
+    kwargs = {'ncompfruit':2, 'ncompleaf':2}
+    previous = initialvalues(*earlier, '2024-01-01', temp, **kwargs)
+    result = initialvalues(*later, '2024-01-08', temp, previous=previous, **kwargs)
+    # Organs emerging after the earlier measurement (negative age in it, DVSI=0) and after the later one (negative age)
+    assert (previous['dffruit']['FAGE'] < 0).any()
+    assert (result['dffruit']['FAGE'] < 0).any()
+    for organ, coldoe, coldvsi in [('dffruit', 'DOEF', 'DVSF'), ('dfleaf', 'DOEL', 'DVSL')]:
+        full = dataset(*later, **kwargs).DVSI(result[organ].drop(columns=coldvsi), coldoe, coldvsi, result['measureddate'], temp, None, None, cache=False)
+        np.testing.assert_allclose(result[organ][coldvsi].to_numpy(), full[coldvsi].to_numpy(), rtol=1e-12, atol=1e-12)